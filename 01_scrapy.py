@@ -1,20 +1,41 @@
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+import os
 import time
 from bs4 import BeautifulSoup
 import lxml
 import pandas as pd
-import re
 from datetime import datetime
 from selenium.webdriver.common.keys import Keys 
+from product_store import save_snapshot
+from product_scraper import PRODUCT_COLUMNS
+from scrape_workers import DETAIL_WORKERS
+from http_fetch import HTTP_CONCURRENCY
+from scrape_state import ScrapeState, REFRESH_AFTER_HOURS
+from pipeline import run_pipeline, PAGE_WORKERS
+from browser import new_driver, BROWSER_PROFILE
+from extractor import SEARCH_READY_CSS
+from price_history import PriceHistory, HISTORY_FILE
+import run_log
+from run_log import stage
 
 
 # Inputs to search
 
 search_box_text = 'sports shoes for men'
 website_link = 'https://www.flipkart.com/'
+detail_workers = DETAIL_WORKERS  # workers scraping product pages in parallel
+page_workers = PAGE_WORKERS  # workers reading search results pages in parallel
+browser_profile = BROWSER_PROFILE  # 'fast': eager load, no images/css/fonts/trackers; 'full': load everything
+headless_browser = True
+max_products = 30  # For demonstration purpose we are scraping only 30 products, set to None to scrape all
+fetch_mode = 'http'  # 'http': pooled HTTP requests, browser only for pages that fail to parse; 'browser': Selenium for every page
+http_concurrency = HTTP_CONCURRENCY
+refresh_after_hours = REFRESH_AFTER_HOURS  # products scraped more recently than this are skipped
+retry_failed_only = False  # True: only rescrape products whose last attempt failed
+run_log_file = run_log.RUN_LOG_FILE  # per-stage timings (navigate, wait, extract, write) as JSON lines
+price_history_file = HISTORY_FILE  # changed price/discount/rating/availability values of every run
 
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
 
@@ -22,11 +43,13 @@ from selenium.common.exceptions import TimeoutException, NoSuchElementException,
 # Session start time
 session_start_time = datetime.now().time()
 print(f"Session Start Time: {session_start_time} ---------------------------> ")
+run_log.start(run_log_file)
 
-driver = webdriver.Chrome()
+all_pagination_links = []
+driver = new_driver(headless=headless_browser, profile=browser_profile)
 try:
-    driver.get(website_link)
-    driver.maximize_window()
+    with stage('navigate', url=website_link, via='browser', page='home'):
+        driver.get(website_link)
 
     # Try to close login popup if present
     try:
@@ -50,7 +73,8 @@ try:
     search_input.send_keys(Keys.RETURN) 
     print('Waiting for search results...') 
     try:
-        WebDriverWait(driver, 30).until(EC.presence_of_element_located((By.CSS_SELECTOR, '[target="_blank"]')))
+        with stage('wait', url=website_link, page='search'):
+            WebDriverWait(driver, 30, poll_frequency=0.1).until(EC.presence_of_element_located((By.CSS_SELECTOR, SEARCH_READY_CSS)))
     except TimeoutException:
         print('Search results did not load. Exiting.')
         driver.quit()
@@ -80,32 +104,6 @@ try:
     print('Pagination Links Count:', len(all_pagination_links)) 
     print("All Pagination Links: ", all_pagination_links)
 
-    print("Collecting Product Detail Page Links")
-    all_product_links = []
-    for idx, link in enumerate(all_pagination_links):
-        print(f'Processing page {idx+1}/{len(all_pagination_links)}: {link}')
-        try:
-            driver.get(link)
-            WebDriverWait(driver, 30).until(lambda d: d.execute_script('return document.readyState') == 'complete')
-            try:
-                WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CLASS_NAME, 'rPDeLR')))
-                all_products = driver.find_elements(By.CLASS_NAME, 'rPDeLR')
-            except TimeoutException:
-                print('Class rPDeLR not found, trying _1fQZEK')
-                all_products = driver.find_elements(By.CLASS_NAME, '_1fQZEK')
-            all_links = [element.get_attribute('href') for element in all_products if element.get_attribute('href')]
-            print(f"{link} Done ------> Found {len(all_links)} products")
-            all_product_links.extend(all_links)
-        except Exception as e:
-            print(f"Failed to process {link}: {e}")
-
-    print('All Product Detail Page Links Captured: ', len(all_product_links)) 
-    df_product_links = pd.DataFrame(all_product_links, columns=['product_links'])
-    df_product_links = df_product_links.drop_duplicates(subset=['product_links'])
-
-    print("Total Product Detail Page Links", len(df_product_links))
-    df_product_links.to_csv('flipkart_product_links.csv', index = False)
-
 except WebDriverException as e:
     print(f'WebDriverException occurred: {e}')
 except Exception as e:
@@ -118,114 +116,50 @@ finally:
     session_end_time = datetime.now().time()
     print(f"Session End Time: {session_end_time} ---------------------------> ")
 
-# The code above is a complete script for scraping product links from Flipkart using Selenium.
+# The code above finds the search results pages, everything after streams through the pipeline:
+# results pages -> product links -> product details -> csv files, all at the same time.
 
 #session start time
 session_start_time = datetime.now().time()
 print(f"Session Start Time: {session_start_time} ---------------------------> ")
 
-
-#reading the csv file which contain all product links
-df_product_links = pd.read_csv("flipkart_product_links.csv")
-
-# Remove the below line to scrap all the products. For demonstration purpose we are scraping only 10 products
-df_product_links = df_product_links.head(30)
-
-all_product_links = df_product_links['product_links'].tolist()
-print("Collecting Individual Product Detail Information")
-
-#starting the browser
-driver = webdriver.Chrome()
-
-
-complete_product_details = []
-unavailable_products = []
-successful_parsed_urls_count = 0
-complete_failed_urls_count = 0
-
-for product_page_link in all_product_links:
-    try: 
-        driver.get(product_page_link)
-        # Wait for the page to load by checking document.readyState
-        WebDriverWait(driver, 20).until(lambda d: d.execute_script('return document.readyState') == 'complete')
-        WebDriverWait(driver, 20).until( EC.presence_of_element_located((By.CSS_SELECTOR, '[target="_blank"]')))
-        #checking if product is available or not
-        try:
-            product_status =  driver.find_element(By.CLASS_NAME, 'Z8JjpR').text
-            if product_status == 'Currently Unavailable' or product_status == 'Sold Out':
-                unavailable_products.append(product_page_link)
-                successful_parsed_urls_count += 1
-                print(f"URL {successful_parsed_urls_count} completed --->")
-        except:
-            pass
-        #brand
-        brand =  driver.find_element(By.CLASS_NAME, 'mEh187').text
-        #title       
-        title = driver.find_element(By.CLASS_NAME, 'VU-ZEz').text
-        title = re.sub(r'\s*\([^)]*\)', '', title)  #removing data withing parenthesis (color information)
-        #price      
-        price = driver.find_element(By.CLASS_NAME, 'Nx9bqj').text
-        price = re.findall(r'\d+', price)
-        price = ''.join(price)
-        # Discount  
-        try:
-            discount = driver.find_element(By.CLASS_NAME, 'UkUFwK').text
-            discount = re.findall(r'\d+', discount)
-            discount = ''.join(discount)
-            discount = int(discount) / 100
-        except:
-            discount = ''
-        #for a new product, there will be no avg_rating and total_ratings    
-        try:
-            product_review_status = driver.find_element(By.CLASS_NAME, 'E3XX7J').text
-            if product_review_status == 'Be the first to Review this product':
-                avg_rating = ''
-                total_ratings = ''
-        except:
-            avg_rating = driver.find_element(By.CLASS_NAME, 'XQDdHH').text
-            total_ratings = driver.find_element(By.CLASS_NAME, 'Wphh3N').text.split(' ')[0]
-            #remove the special character
-            if ',' in total_ratings:
-                total_ratings = int(total_ratings.replace(',', ''))
-            else:
-                total_ratings = int(total_ratings)
-        # image_url
-        try:
-            image_url = driver.find_element(By.CSS_SELECTOR, 'img._396cs4').get_attribute('src')
-        except Exception:
-            image_url = ''
-        successful_parsed_urls_count += 1
-        print(f"URL {successful_parsed_urls_count} completed *******")
-        complete_product_details.append([product_page_link, title, brand, price, discount, avg_rating, total_ratings, image_url])  
-    except Exception as e:
-        print(f"Failed to establish a connection for URL {product_page_link}:  {e}")
-        unavailable_products.append(product_page_link)
-        complete_failed_urls_count += 1
-        print(f"Failed URL Count {complete_failed_urls_count}")
-
-
-#create pandas dataframe 
-df = pd.DataFrame(complete_product_details, columns = ['product_link', 'title', 'brand', 'price', 'discount', 'avg_rating', 'total_ratings', 'image_url'])
-#duplicates processing
-df_duplicate_products = df[df.duplicated(subset=['brand', 'price', 'discount', 'avg_rating', 'total_ratings'])]
-df = df.drop_duplicates(subset=['brand', 'price', 'discount', 'avg_rating', 'total_ratings'])
-#unavailable products
-df_unavailable_products = pd.DataFrame(unavailable_products, columns=['link'])
+#only new, stale or previously failed products are scraped; every result is checkpointed by pid
+scrape_state = ScrapeState()
+#products already in the dataset are known to the state, so they are not fetched again while fresh
+if os.path.exists('flipkart_product_data.csv'):
+    existing_mtime = os.path.getmtime('flipkart_product_data.csv')
+    with stage('seed'):
+        for df_existing in pd.read_csv('flipkart_product_data.csv', chunksize=10000):
+            df_existing = df_existing.reindex(columns=PRODUCT_COLUMNS)
+            df_existing = df_existing.astype(object).where(df_existing.notna(), '')
+            scrape_state.seed(df_existing.values.tolist(), existing_mtime)
+
+print("Collecting Product Detail Page Links and Product Details")
+stats = run_pipeline(all_pagination_links, scrape_state, detail_workers=detail_workers, page_workers=page_workers,
+                     fetch_mode=fetch_mode, http_concurrency=http_concurrency, max_products=max_products,
+                     max_age_hours=refresh_after_hours, failed_only=retry_failed_only, browser_profile=browser_profile)
+
+#only values that changed since the previous run are appended to the price history;
+#products whose page failed to load are not recorded as unavailable
+with stage('history'):
+    unavailable_links = [link for link in pd.read_csv('unavailable_products.csv')['link']
+                         if (scrape_state.lookup(link) or {}).get('status') == 'unavailable']
+    PriceHistory(price_history_file).record_csv('flipkart_product_data.csv', unavailable_links)
+scrape_state.close()
 
 
 #prining the stats
-print("Total product pages scrapped: ", len(all_product_links))
-print("Final Total Products: ", len(df))
-print("Total Unavailable Products : ", len(df_unavailable_products))
-print("Total Duplicate Products: ", len(df_duplicate_products))
+print("Total product pages scrapped: ", stats['scraped'], f"({stats['fresh']} still fresh, {stats['failed']} failed)")
+print("Final Total Products: ", stats['products'])
+print("Total Unavailable Products : ", stats['unavailable'])
+print("Total Duplicate Products: ", stats['duplicates'])
 
 
-#saving all the files
-df.to_csv('flipkart_product_data.csv', index = False)
-df_unavailable_products.to_csv('unavailable_products.csv', index = False)
-df_duplicate_products.to_csv('duplicate_products.csv', index = False)
+# columnar snapshot the servers memory-map instead of parsing the CSV
+with stage('snapshot'):
+    save_snapshot(pd.read_csv('flipkart_product_data.csv'))
+run_log.finish(**stats)
 
 
-driver.close()
 session_end_time = datetime.now().time()
-print(f"Session End Time: {session_end_time} ---------------------------> ")
\ No newline at end of file
+print(f"Session End Time: {session_end_time} ---------------------------> ")
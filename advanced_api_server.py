@@ -1,16 +1,24 @@
 from flask import Flask, jsonify, request, send_file, redirect, url_for, render_template, session
-import pandas as pd
+import numpy as np
 import os
-import io
 import jwt
 import datetime
 from functools import wraps
 from werkzeug.utils import secure_filename
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+from product_store import store, current, to_records, enable_copy_on_write
+from product_query import query_rows, page_rows, page_size
+from response_cache import cached_json, normalize_query, facet_cache
+from metrics import instrument
+from export_stream import export_response
+from facets import facet_counts
+from excel_export import build_xlsx, XLSX_MIMETYPE
+from bulk_ingest import ingest_csv
+from charts import chart_file, binned, chart_params, CHART_FORMATS
 
 app = Flask(__name__)
+# Route latency histograms and GET /metrics
+instrument(app)
+enable_copy_on_write()
 app.secret_key = 'your_secret_key'
 JWT_SECRET = 'jwt_secret_key'
 UPLOAD_FOLDER = 'uploads'
@@ -45,13 +53,52 @@ def login():
         return jsonify({'token': token})
     return jsonify({'message': 'Invalid credentials'}), 401
 
-# --- API: GET all products (simple, no JWT) ---
+# --- API: GET products page by page (simple, no JWT) ---
 @app.route('/api/products', methods=['GET'])
 def get_products():
     try:
-        df = pd.read_csv('flipkart_product_data.csv')
-        data = df.to_dict(orient='records')
-        return jsonify({'products': data})
+        ds = current()
+        page = request.args.get('page', 1, type=int)
+        per_page = page_size(request.args.get('per_page'))
+        cursor = request.args.get('cursor')
+
+        def build():
+            rows = np.arange(len(ds.df))
+            chunk, next_cursor = page_rows(ds, rows, page, per_page, cursor)
+            return {'products': to_records(ds.df.iloc[chunk]), 'total': len(rows), 'page': page,
+                    'per_page': per_page, 'next_cursor': next_cursor}
+
+        key = normalize_query({'page': page, 'per_page': per_page, 'cursor': cursor})
+        return cached_json(ds.version, key, build)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# --- API: Streaming export (NDJSON or CSV), same filters as the other servers ---
+@app.route('/api/products/export', methods=['GET'])
+def export_products():
+    try:
+        ds = current()
+        rows = query_rows(ds, brand=request.args.get('brand'), title=request.args.get('title'),
+                          min_price=request.args.get('min_price', type=float),
+                          max_price=request.args.get('max_price', type=float),
+                          sort_by=request.args.get('sort_by'), ascending=(request.args.get('order', 'asc')=='asc'))
+        return export_response(ds, rows, request.args.get('format', 'ndjson'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# --- API: Facet counts (brands, price/discount histograms, rating buckets) for the current filter ---
+@app.route('/api/products/facets', methods=['GET'])
+def get_facets():
+    try:
+        ds = current()
+        filters = {name: request.args.get(name) for name in ('brand', 'title', 'min_price', 'max_price')}
+        return cached_json(ds.version, normalize_query(filters), lambda: facet_counts(ds, **filters), cache=facet_cache)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -65,11 +112,11 @@ def add_product():
             image = request.files['image']
             filename = secure_filename(image.filename)
             image.save(os.path.join(UPLOAD_FOLDER, filename))
-            new_product['image'] = filename
-        df = pd.read_csv('flipkart_product_data.csv')
-        df = df.append(new_product, ignore_index=True)
-        df.to_csv('flipkart_product_data.csv', index=False)
+            new_product['image_url'] = filename
+        store.add([new_product])
         return jsonify({'message': 'Product added successfully.'}), 201
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -79,11 +126,11 @@ def add_product():
 def bulk_upload():
     try:
         file = request.files['file']
-        df_new = pd.read_csv(file)
-        df = pd.read_csv('flipkart_product_data.csv')
-        df = pd.concat([df, df_new], ignore_index=True)
-        df.to_csv('flipkart_product_data.csv', index=False)
-        return jsonify({'message': 'Bulk upload successful.'})
+        # Parsed and upserted chunk by chunk, rows matched to existing products by canonical key
+        stats = ingest_csv(store, file.stream)
+        return jsonify(dict(stats, message='Bulk upload successful.'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -92,12 +139,9 @@ def bulk_upload():
 @token_required
 def export_excel():
     try:
-        df = pd.read_csv('flipkart_product_data.csv')
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False)
-        output.seek(0)
-        return send_file(output, as_attachment=True, download_name='products.xlsx', mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        # Built once per dataset version, then served from disk with ETag/Range support
+        path = build_xlsx(current())
+        return send_file(path, as_attachment=True, download_name='products.xlsx', mimetype=XLSX_MIMETYPE, conditional=True)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -106,17 +150,37 @@ def export_excel():
 @token_required
 def export_pdf():
     try:
-        df = pd.read_csv('flipkart_product_data.csv')
-        plt.figure(figsize=(8,4))
-        df['price'] = pd.to_numeric(df['price'], errors='coerce')
-        df['price'].plot.hist(bins=20)
-        plt.title('Price Distribution')
-        plt.xlabel('Price')
-        plt.ylabel('Count')
-        pdf_path = 'price_chart.pdf'
-        plt.savefig(pdf_path)
-        plt.close()
-        return send_file(pdf_path, as_attachment=True)
+        path = chart_file(current(), 'price', 20, 'pdf')
+        return send_file(path, as_attachment=True, download_name='price_chart.pdf', conditional=True)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# --- API: Distribution charts (price/discount/avg_rating), cached per dataset version ---
+@app.route('/api/products/chart', methods=['GET'])
+@token_required
+def product_chart():
+    try:
+        ds = current()
+        column, bins, fmt = chart_params(request.args.get('column', 'price'), request.args.get('bins', 20, type=int),
+                                         request.args.get('format', 'png'))
+        path = chart_file(ds, column, bins, fmt)
+        return send_file(path, mimetype=CHART_FORMATS[fmt], conditional=True)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# --- API: Binned aggregates behind the charts ---
+@app.route('/api/products/chart_data', methods=['GET'])
+@token_required
+def product_chart_data():
+    try:
+        ds = current()
+        column, bins, _ = chart_params(request.args.get('column', 'price'), request.args.get('bins', 20, type=int))
+        counts, edges = binned(ds, column, bins)
+        return jsonify({'column': column, 'counts': counts.tolist(), 'edges': edges.round(4).tolist()})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1,9 +1,21 @@
 
+import os
+import logging
 from flask import Flask, jsonify, render_template, request
-import pandas as pd
-import numpy as np
+from product_store import current, to_records, enable_copy_on_write
+from product_query import query_rows, page_rows, page_size
+from response_cache import cached_json, normalize_query, facet_cache
+from facets import facet_counts
+from metrics import instrument
+
+# LOG_LEVEL=DEBUG brings back the per-request dumps (unique values, matched rows)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'), format='%(asctime)s %(name)s %(levelname)s %(message)s')
+log = logging.getLogger('api_server')
 
 app = Flask(__name__, template_folder='templates')
+# Route latency histograms and GET /metrics
+instrument(app)
+enable_copy_on_write()
 @app.route('/')
 def home():
     return render_template('index.html')
@@ -12,50 +24,62 @@ def home():
 def get_products():
     try:
         page = int(request.args.get('page', 1))
+        per_page = page_size(request.args.get('per_page'))
+        cursor = request.args.get('cursor', '').strip()
         brand = request.args.get('brand', '').strip().lower()
         title = request.args.get('title', '').strip().lower()
         min_price = request.args.get('min_price', '').strip()
         max_price = request.args.get('max_price', '').strip()
-        print(f"Reading CSV...", flush=True)
-        df = pd.read_csv('flipkart_product_data.csv')
-        print(f"Loaded {len(df)} rows from CSV", flush=True)
-        # Filtering
-        if brand:
-            df['brand'] = df['brand'].astype(str).str.strip().str.lower()
-            print('BRAND COLUMN UNIQUE VALUES:', df['brand'].unique(), flush=True)
-            df = df[df['brand'].str.contains(brand)]
-            print(f"Filtered by brand '{brand}', {len(df)} rows left", flush=True)
-            print(df[['brand','title','price']].head(10), flush=True)
-        if title:
-            df['title'] = df['title'].astype(str).str.strip().str.lower()
-            print('TITLE COLUMN UNIQUE VALUES:', df['title'].unique(), flush=True)
-            df = df[df['title'].str.contains(title)]
-            print(f"Filtered by title '{title}', {len(df)} rows left", flush=True)
-            print(df[['brand','title','price']].head(10), flush=True)
-        if min_price:
-            df = df[pd.to_numeric(df['price'], errors='coerce') >= float(min_price)]
-            print(f"Filtered by min_price '{min_price}', {len(df)} rows left", flush=True)
-        if max_price:
-            df = df[pd.to_numeric(df['price'], errors='coerce') <= float(max_price)]
-            print(f"Filtered by max_price '{max_price}', {len(df)} rows left", flush=True)
-        total = len(df)
-        per_page = len(df)
-        start = (page - 1) * per_page
-        end = start + per_page
-        # Replace all NaN in the DataFrame with None so JSON is valid
-        df = df.replace({np.nan: None})
-        data = df.iloc[start:end].to_dict(orient='records')
-        print(f"Returning {len(data)} products (page {page})", flush=True)
-        return jsonify({
-            'products': data,
-            'total': total,
-            'per_page': per_page,
-            'page': page
-        })
+        ds = current()
+        df = ds.df
+
+        def build():
+            # The dumps are only computed when debug logging is on
+            debug = log.isEnabledFor(logging.DEBUG)
+            if debug:
+                log.debug("Using %d cached rows", len(df))
+                if brand:
+                    log.debug('BRAND COLUMN UNIQUE VALUES: %s', df['brand'].unique())
+                if title:
+                    log.debug('TITLE COLUMN UNIQUE VALUES: %s', df['title'].unique())
+            # Filtering through the token and price indexes, no per-request column scans
+            rows = query_rows(ds, brand=brand, title=title, min_price=min_price, max_price=max_price)
+            if debug:
+                log.debug("Filtered by brand '%s' title '%s' price '%s'-'%s', %d rows left", brand, title, min_price, max_price, len(rows))
+                if brand or title:
+                    log.debug('\n%s', df.iloc[rows[:10]][['brand','title','price']])
+            total = len(rows)
+            chunk, next_cursor = page_rows(ds, rows, page, per_page, cursor)
+            # to_records replaces NaN/NA with None so JSON is valid
+            data = to_records(df.iloc[chunk])
+            log.debug("Returning %d products (page %d)", len(data), page)
+            return {
+                'products': data,
+                'total': total,
+                'per_page': per_page,
+                'page': page,
+                'next_cursor': next_cursor
+            }
+
+        # Repeated queries against the same dataset version are served from the result cache
+        return cached_json(ds.version, normalize_query(request.args, {'page': page, 'per_page': per_page}), build)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        log.exception('API ERROR: %s', e)
+        return jsonify({'error': str(e)}), 500
+
+# --- API: Facet counts (brands, price/discount histograms, rating buckets) for the current filter ---
+@app.route('/api/products/facets', methods=['GET'])
+def get_facets():
+    try:
+        ds = current()
+        filters = {name: request.args.get(name) for name in ('brand', 'title', 'min_price', 'max_price')}
+        return cached_json(ds.version, normalize_query(filters), lambda: facet_counts(ds, **filters), cache=facet_cache)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        import traceback
-        print('API ERROR:', str(e), flush=True)
-        traceback.print_exc()
+        log.exception('API ERROR: %s', e)
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
@@ -0,0 +1,71 @@
+import sys
+import numpy as np
+import pandas as pd
+
+# Seeded synthetic catalogue with the flipkart_product_data.csv schema, e.g.
+#   python bench_data.py 100000 bench_100k.csv [seed]
+# Same rows and seed -> byte-identical file, so benchmark runs are comparable.
+
+COLUMNS = ['product_link', 'title', 'brand', 'price', 'discount', 'avg_rating', 'total_ratings']
+BRANDS = ['BRUTON', 'action', 'Aeonik', 'Winprice', 'URBANBOX', 'Abros', 'richerson', 'CAMPUS',
+          'World Wear Footwear', 'ASIAN', 'Sparx', 'RED TAPE', 'PUMA', 'ADIDAS', 'Bata', 'Lakhani',
+          'HRX by Hrithik Roshan', 'Reebok', 'Skechers', 'Liberty', 'Khadims', 'Paragon', 'BIRDE', 'Kraasa']
+ADJECTIVES = ['Lite', 'Premium', 'Lightweight', 'Comfortable', 'Trendy', 'Stylish', 'Breathable', 'Classic',
+              'Memory Foam', 'Soft', 'Durable', 'Casual', 'Sports', 'Latest', 'Super', 'Pro', 'Max', 'Air']
+KINDS = ['Running Shoes', 'Walking Shoes', 'Sports Shoes', 'Sneakers', 'Casuals', 'Training Shoes',
+         'Party Wear', 'Trekking Shoes', 'Slip On', 'Loafers']
+# Shares of unrated (new) products and products without a listed discount
+UNRATED_SHARE = 0.1
+NO_DISCOUNT_SHARE = 0.05
+CHUNK_ROWS = 100000
+
+
+def _chunk(rng, start, count):
+    brand = np.array(BRANDS, dtype=object)[rng.integers(0, len(BRANDS), count)]
+    adj1 = np.array(ADJECTIVES, dtype=object)[rng.integers(0, len(ADJECTIVES), count)]
+    adj2 = np.array(ADJECTIVES, dtype=object)[rng.integers(0, len(ADJECTIVES), count)]
+    kind = np.array(KINDS, dtype=object)[rng.integers(0, len(KINDS), count)]
+    model = rng.integers(100, 1000, count).astype(str).astype(object)
+    title = adj1 + ' ' + adj2 + ' ' + model + ' ' + kind + ' For Men'
+    ids = np.arange(start, start + count)
+    itm = np.char.mod('itm%014x', ids * 2654435761 % (1 << 56)).astype(object)
+    pid = np.char.mod('SHOG%012X', ids).astype(object)
+    slug = pd.Series(brand + '-' + kind).str.lower().str.replace(' ', '-', regex=False).to_numpy(dtype=object)
+    link = 'https://www.flipkart.com/' + slug + '/p/' + itm + '?pid=' + pid + '&lid=LST' + pid + 'ABCDEF'
+    price = np.clip(np.round(rng.lognormal(6.4, 0.5, count)), 149, 9999).astype('int64')
+    discount = pd.array(np.round(rng.uniform(0.05, 0.85, count), 2), dtype='Float64')
+    discount[rng.random(count) < NO_DISCOUNT_SHARE] = pd.NA
+    unrated = rng.random(count) < UNRATED_SHARE
+    avg_rating = pd.array(np.round(np.clip(rng.normal(3.9, 0.35, count), 1, 5), 1), dtype='Float64')
+    total_ratings = pd.array(rng.integers(1, 200000, count), dtype='Int64')
+    avg_rating[unrated] = pd.NA
+    total_ratings[unrated] = pd.NA
+    return pd.DataFrame({'product_link': link, 'title': title, 'brand': brand, 'price': price,
+                         'discount': discount, 'avg_rating': avg_rating, 'total_ratings': total_ratings},
+                        columns=COLUMNS)
+
+
+def iter_chunks(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, CHUNK_ROWS):
+        yield _chunk(rng, start, min(CHUNK_ROWS, rows - start))
+
+
+def synthetic_rows(rows, seed=0):
+    # The same rows generate() writes, as one frame
+    return pd.concat(list(iter_chunks(rows, seed)), ignore_index=True)
+
+
+def generate(rows, path, seed=0):
+    # Written in chunks, so 1M rows never sit in memory as one frame
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        for i, chunk in enumerate(iter_chunks(rows, seed)):
+            chunk.to_csv(f, index=False, header=i == 0)
+    return path
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    path = sys.argv[2] if len(sys.argv) > 2 else f'bench_{rows}.csv'
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    print(generate(rows, path, seed))
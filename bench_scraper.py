@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from contextlib import redirect_stdout
+from concurrent.futures import ThreadPoolExecutor
+from bench_data import synthetic_rows
+from canonical import parse_product_link, dedupe_links
+from extractor import parse_product_links
+from fixture_site import make_handler, serve, load_catalogue, golden_record, load_golden, search_urls, SEARCH_PER_PAGE
+from http_fetch import new_session, scrape_products_http, HTTP_CONCURRENCY
+from product_scraper import PRODUCT_COLUMNS
+
+# Offline scraper benchmark against the local fixture site, e.g.
+#   python bench_scraper.py --products 2000 --latency 0.05 --error-rate 0.02 --concurrency 16
+# Runs the link collection and detail extraction stages, reports pages/sec and time per
+# stage, and checks every extracted record against its golden record. The saved fixture
+# pages are always checked first, so selector regressions show up even in a tiny run.
+
+FIELDS = PRODUCT_COLUMNS[1:]
+
+
+def _norm(value):
+    if value is None or value == '':
+        return ''
+    try:
+        return round(float(value), 4)
+    except (TypeError, ValueError):
+        return str(value).strip()
+
+
+def compare(result, expected):
+    # Names of the fields (or 'status') where result differs from the golden record
+    if expected is None:
+        return ['golden']
+    if result[0] != expected['status']:
+        return ['status']
+    if result[0] != 'ok':
+        return []
+    row = dict(zip(FIELDS, result[1][1:]))
+    return [field for field in FIELDS if _norm(row.get(field)) != _norm(expected['row'].get(field))]
+
+
+def collect_links(session, pages, concurrency):
+    # Stage 1: results pages -> canonical product links
+    def fetch(url):
+        try:
+            response = session.get(url, timeout=15)
+            if response.status_code != 200:
+                return None
+            return parse_product_links(response.content, url)
+        except Exception:
+            return None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        found = list(pool.map(fetch, pages))
+    elapsed = time.perf_counter() - start
+    links = dedupe_links([link for page in found if page for link in page])
+    stage = {'pages': len(pages), 'failed': sum(1 for page in found if page is None), 'links': len(links),
+             'seconds': round(elapsed, 3), 'pages_per_s': round(len(pages) / elapsed, 1) if elapsed else None}
+    return links, stage
+
+
+def extract_details(session, links, concurrency):
+    # Stage 2: product pages -> parsed records, HTTP only (no browser fallback offline)
+    results = {}
+    start = time.perf_counter()
+    scrape_products_http(links, concurrency, fallback=False, session=session,
+                         on_result=lambda link, result: results.__setitem__(link, result))
+    elapsed = time.perf_counter() - start
+    stage = {'pages': len(links), 'failed': sum(1 for r in results.values() if r[0] == 'failed'),
+             'seconds': round(elapsed, 3), 'pages_per_s': round(len(links) / elapsed, 1) if elapsed else None}
+    return results, stage
+
+
+def check(results, golden):
+    field_errors, examples = {}, []
+    correct = 0
+    fetched = [(link, r) for link, r in results.items() if r[0] != 'failed']
+    for link, result in fetched:
+        wrong = compare(result, golden.get(parse_product_link(link)[0]))
+        if not wrong:
+            correct += 1
+            continue
+        for field in wrong:
+            field_errors[field] = field_errors.get(field, 0) + 1
+        if len(examples) < 10:
+            examples.append({'link': link, 'fields': wrong, 'result': list(result)})
+    return {'checked': len(fetched), 'correct': correct,
+            'accuracy': round(correct / len(fetched), 4) if fetched else None,
+            'field_errors': field_errors, 'examples': examples}
+
+
+def run_site(handler, pages, golden, concurrency, pipeline=False):
+    server, base_url = serve(handler=handler)
+    session = new_session(concurrency)
+    try:
+        total_start = time.perf_counter()
+        # Scraper progress goes to stderr, stdout is kept for the JSON report
+        with redirect_stdout(sys.stderr):
+            links, link_stage = collect_links(session, search_urls(base_url, pages), concurrency)
+            results, detail_stage = extract_details(session, links, concurrency)
+        report = {
+            'stages': {'links': link_stage, 'details': detail_stage},
+            'total_seconds': round(time.perf_counter() - total_start, 3),
+            'correctness': check(results, golden),
+        }
+        if pipeline:
+            with redirect_stdout(sys.stderr):
+                report['pipeline'] = run_pipeline_stage(search_urls(base_url, pages), concurrency)
+        return report
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def run_pipeline_stage(pages, concurrency):
+    # The streaming pipeline 01_scrapy.py uses, end to end into throwaway files.
+    # Pages that fail over HTTP go to the browser there, so this needs Chrome.
+    from pipeline import run_pipeline
+    from scrape_state import ScrapeState
+    workdir = tempfile.mkdtemp(prefix='bench_scraper_')
+    state = ScrapeState(os.path.join(workdir, 'scrape_state.db'))
+    try:
+        start = time.perf_counter()
+        stats = run_pipeline(pages, state, http_concurrency=concurrency,
+                             data_file=os.path.join(workdir, 'data.csv'), links_file=os.path.join(workdir, 'links.csv'),
+                             unavailable_file=os.path.join(workdir, 'unavailable.csv'),
+                             duplicates_file=os.path.join(workdir, 'duplicates.csv'))
+        elapsed = time.perf_counter() - start
+        return dict(stats, seconds=round(elapsed, 3), pages_per_s=round((stats['pages'] + stats['scraped']) / elapsed, 1))
+    finally:
+        state.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline scraper benchmark against the fixture site')
+    parser.add_argument('--products', type=int, default=1000, help='size of the generated catalogue, 0 for saved pages only')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to each response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with 503')
+    parser.add_argument('--concurrency', type=int, default=HTTP_CONCURRENCY)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--pipeline', action='store_true', help='also time the full streaming pipeline (needs Chrome for fallbacks)')
+    parser.add_argument('--out', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    report = {'config': vars(args)}
+    # Saved pages: real layouts (both card selectors, unrated, no discount, unavailable), no faults
+    report['saved'] = run_site(make_handler(), 2, load_golden(), args.concurrency)
+    if args.products:
+        catalogue = load_catalogue(synthetic_rows(args.products, args.seed))
+        golden = {product['itm']: golden_record(product) for product in catalogue}
+        pages = (len(catalogue) + SEARCH_PER_PAGE - 1) // SEARCH_PER_PAGE
+        handler = make_handler(args.latency, args.error_rate, catalogue)
+        report['generated'] = run_site(handler, pages, golden, args.concurrency, args.pipeline)
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output)
+    print(output)
@@ -0,0 +1,211 @@
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import numpy as np
+import requests
+from bench_data import generate, BRANDS, ADJECTIVES, KINDS
+
+# Load benchmark for the three Flask servers on synthetic catalogues, e.g.
+#   python bench_servers.py --rows 10000,100000 --servers api,web,advanced --duration 20 --out bench.json
+# Every server runs in its own process and working directory on a fresh copy of the data,
+# so writes from one run never leak into the next. Results are printed as JSON.
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVERS = {'api': 'api_server', 'web': 'web_api_server', 'advanced': 'advanced_api_server'}
+DEFAULT_MIX = {'search': 30, 'price_range': 20, 'sort': 15, 'deep_page': 15, 'export': 5, 'write': 15}
+# What each server can do; ops a server lacks are left out of its mix
+SUPPORTED = {
+    'api': {'search', 'price_range', 'deep_page'},
+    'web': {'search', 'price_range', 'sort', 'deep_page', 'export', 'write'},
+    'advanced': {'deep_page', 'export', 'write'},
+}
+PER_PAGE = 20
+SERVER_CODE = '''
+import sys, importlib
+app = importlib.import_module(sys.argv[1]).app
+app.run(host='127.0.0.1', port=int(sys.argv[2]), threaded=True, debug=False, use_reloader=False)
+'''
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _peak_rss_mb(pid):
+    # High-water mark of the server's resident memory (Linux); None elsewhere
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+class Workload:
+    def __init__(self, server, base_url, total, mix, seed):
+        self.server = server
+        self.base_url = base_url
+        self.total = total
+        self.rng = random.Random(seed)
+        ops = [op for op in mix if op in SUPPORTED[server] and mix[op] > 0]
+        self.ops, self.weights = ops, [mix[op] for op in ops]
+        self.session = requests.Session()
+        self.token = None
+        if server == 'advanced' and 'write' in ops:
+            self.token = self.session.post(f'{base_url}/login', json={'username': 'admin', 'password': 'admin'}).json()['token']
+
+    def _get(self, path, **params):
+        response = self.session.get(self.base_url + path, params=params, stream=True)
+        for _ in response.iter_content(65536):
+            pass
+        return response.status_code
+
+    def run(self, op):
+        rng = self.rng
+        if op == 'search':
+            return self._get('/api/products', brand=rng.choice(BRANDS).lower()[:4], title=rng.choice(ADJECTIVES + KINDS).lower(), per_page=PER_PAGE)
+        if op == 'price_range':
+            low = rng.randrange(149, 3000)
+            return self._get('/api/products', min_price=low, max_price=low + rng.randrange(50, 1000), per_page=PER_PAGE)
+        if op == 'sort':
+            return self._get('/api/products', sort_by=rng.choice(['price', 'avg_rating', 'discount', 'total_ratings']),
+                             order=rng.choice(['asc', 'desc']), page=rng.randrange(1, 50), per_page=PER_PAGE)
+        if op == 'deep_page':
+            last = max(1, self.total // PER_PAGE)
+            return self._get('/api/products', page=rng.randrange(max(1, last - last // 10), last + 1), per_page=PER_PAGE)
+        if op == 'export':
+            return self._get('/api/products/export', format=rng.choice(['ndjson', 'csv']), brand=rng.choice(BRANDS).lower())
+        if op == 'write':
+            row = {'product_link': f'https://www.flipkart.com/bench/p/itmbench{rng.randrange(1 << 40):x}',
+                   'title': 'Bench Running Shoes For Men', 'brand': rng.choice(BRANDS), 'price': rng.randrange(149, 5000)}
+            if self.server == 'advanced':
+                response = self.session.post(self.base_url + '/api/products', data=row, headers={'x-access-token': self.token})
+            else:
+                response = self.session.post(self.base_url + '/api/products', json=row)
+            return response.status_code
+        raise ValueError(op)
+
+
+def _percentiles(latencies):
+    if not latencies:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    return {'p50_ms': round(p50, 2), 'p95_ms': round(p95, 2), 'p99_ms': round(p99, 2)}
+
+
+def bench_server(server, data_path, rows, duration, concurrency, mix, seed):
+    workdir = tempfile.mkdtemp(prefix=f'bench_{server}_')
+    shutil.copy(data_path, os.path.join(workdir, 'flipkart_product_data.csv'))
+    port = _free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    env = dict(os.environ, PYTHONPATH=REPO_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    proc = subprocess.Popen([sys.executable, '-c', SERVER_CODE, SERVERS[server], str(port)], cwd=workdir, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        # Startup includes the first load of the catalogue (CSV parse + snapshot write)
+        start = time.perf_counter()
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f'{server} server exited with code {proc.returncode}')
+            try:
+                if requests.get(f'{base_url}/api/products', params={'per_page': 1}, timeout=600).status_code == 200:
+                    break
+            except requests.ConnectionError:
+                time.sleep(0.1)
+        startup = time.perf_counter() - start
+
+        samples = []
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def worker(i):
+            workload = Workload(server, base_url, rows, mix, seed * 1000 + i)
+            local = []
+            while time.perf_counter() < deadline:
+                op = workload.rng.choices(workload.ops, workload.weights)[0]
+                t0 = time.perf_counter()
+                try:
+                    status = workload.run(op)
+                except requests.RequestException:
+                    status = None
+                local.append((op, time.perf_counter() - t0, status is not None and status < 400))
+            with lock:
+                samples.extend(local)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+
+        per_op = {}
+        for op in sorted({s[0] for s in samples}):
+            lat = [s[1] for s in samples if s[0] == op]
+            per_op[op] = dict(requests=len(lat), errors=sum(1 for s in samples if s[0] == op and not s[2]), **_percentiles(lat))
+        return dict({
+            'server': server,
+            'rows': rows,
+            'concurrency': concurrency,
+            'duration_s': round(elapsed, 2),
+            'startup_s': round(startup, 2),
+            'requests': len(samples),
+            'errors': sum(1 for s in samples if not s[2]),
+            'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else None,
+        }, **_percentiles([s[1] for s in samples]), peak_rss_mb=_peak_rss_mb(proc.pid), ops=per_op)
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _parse_mix(text):
+    mix = dict(DEFAULT_MIX)
+    for part in filter(None, (text or '').split(',')):
+        name, _, weight = part.partition('=')
+        if name not in DEFAULT_MIX:
+            raise SystemExit(f"unknown op '{name}', use: {', '.join(DEFAULT_MIX)}")
+        mix[name] = float(weight)
+    return mix
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load benchmark for the product API servers')
+    parser.add_argument('--rows', default='10000', help='comma separated catalogue sizes, e.g. 10000,100000,1000000')
+    parser.add_argument('--servers', default='api,web,advanced')
+    parser.add_argument('--duration', type=float, default=20, help='seconds of load per server and size')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--mix', help='op weights, e.g. search=50,write=0')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='also write the JSON results to this file')
+    args = parser.parse_args()
+
+    mix = _parse_mix(args.mix)
+    results = []
+    datadir = tempfile.mkdtemp(prefix='bench_data_')
+    try:
+        for rows in [int(r) for r in args.rows.split(',')]:
+            data_path = generate(rows, os.path.join(datadir, f'bench_{rows}.csv'), args.seed)
+            for server in args.servers.split(','):
+                print(f'{server}: {rows} rows, {args.duration}s x {args.concurrency} clients', file=sys.stderr)
+                results.append(bench_server(server, data_path, rows, args.duration, args.concurrency, mix, args.seed))
+    finally:
+        shutil.rmtree(datadir, ignore_errors=True)
+    output = json.dumps({'seed': args.seed, 'mix': mix, 'results': results}, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output)
+    print(output)
@@ -0,0 +1,96 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+from bench_data import generate
+
+# Cold start benchmark: the product store's CSV path (read_csv + compact dtypes) against
+# mapping the columnar snapshot, e.g.
+#   python bench_snapshot.py --rows 200000 --repeat 5
+# Every load runs in a fresh process, so nothing is warm but the OS page cache.
+# Results are printed as JSON: seconds to a ready DataFrame and the process memory after it,
+# split into clean (file backed) and dirty (heap, copied per process) pages.
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+LOAD_CODE = '''
+import sys, json, time
+sys.path.insert(0, sys.argv[3])
+import pandas as pd
+from product_store import _compact
+from snapshot import load_snapshot
+start = time.perf_counter()
+if sys.argv[1] == 'csv':
+    df = _compact(pd.read_csv(sys.argv[2]))
+else:
+    df = load_snapshot(sys.argv[2]).to_frame()
+seconds = time.perf_counter() - start
+memory = {}
+try:
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if name in ('Rss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty'):
+                memory[name] = int(value.split()[0])
+except OSError:
+    pass
+print(json.dumps({'seconds': seconds, 'rows': len(df), 'memory_kb': memory}))
+'''
+
+
+def _load(kind, path):
+    out = subprocess.run([sys.executable, '-c', LOAD_CODE, kind, path, REPO_DIR],
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def _mb(memory, *names):
+    if not memory:
+        return None
+    return round(sum(memory.get(name, 0) for name in names) / 1024, 1)
+
+
+def bench(rows, repeat, workdir):
+    sys.path.insert(0, REPO_DIR)
+    import pandas as pd
+    from product_store import _compact
+    from snapshot import write_snapshot, load_snapshot
+
+    csv_path = generate(rows, os.path.join(workdir, f'bench_{rows}.csv'))
+    snap_path = os.path.join(workdir, f'bench_{rows}.snap')
+    expected = _compact(pd.read_csv(csv_path))
+    write_snapshot(expected, snap_path)
+    pd.testing.assert_frame_equal(load_snapshot(snap_path).to_frame(), expected)
+
+    result = {'rows': rows, 'csv_mb': round(os.path.getsize(csv_path) / 2 ** 20, 1),
+              'snapshot_mb': round(os.path.getsize(snap_path) / 2 ** 20, 1)}
+    for kind, path in (('csv', csv_path), ('snapshot', snap_path)):
+        # One unmeasured load puts the file in the page cache for both paths alike
+        _load(kind, path)
+        runs = [_load(kind, path) for _ in range(repeat)]
+        seconds = [r['seconds'] for r in runs]
+        memory = runs[-1]['memory_kb']
+        result[kind] = {'median_s': round(float(np.median(seconds)), 3), 'min_s': round(min(seconds), 3),
+                        'rss_mb': _mb(memory, 'Rss'),
+                        # Clean pages are file backed: shared with every process mapping the same file
+                        'clean_mb': _mb(memory, 'Shared_Clean', 'Private_Clean'),
+                        'dirty_mb': _mb(memory, 'Shared_Dirty', 'Private_Dirty')}
+    result['speedup'] = round(result['csv']['median_s'] / result['snapshot']['median_s'], 2)
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cold start benchmark: CSV parse against the mapped snapshot')
+    parser.add_argument('--rows', default='200000', help='comma separated catalogue sizes')
+    parser.add_argument('--repeat', type=int, default=5, help='fresh processes per path and size')
+    parser.add_argument('--out', help='also write the JSON results to this file')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(prefix='bench_snapshot_') as workdir:
+        results = [bench(int(rows), max(1, args.repeat), workdir) for rows in args.rows.split(',')]
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(report + '\n')
@@ -0,0 +1,48 @@
+import os
+from selenium import webdriver
+
+# Browser profiles:
+#   'full' - normal page load, everything downloaded (how the scraper used to run)
+#   'fast' - eager page load, images / css / fonts / trackers blocked
+BROWSER_PROFILE = os.environ.get('BROWSER_PROFILE', 'fast')
+
+BLOCKED_URLS = [
+    # images, stylesheets, fonts, media
+    '*.jpg', '*.jpeg', '*.png', '*.gif', '*.webp', '*.svg', '*.ico',
+    '*.css', '*.woff', '*.woff2', '*.ttf', '*.otf', '*.mp4', '*.webm',
+    'rukminim1.flixcart.com/*', 'rukminim2.flixcart.com/*',
+    # third party trackers
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+    '*facebook.net*', '*facebook.com/tr*', '*hotjar.com*', '*clarity.ms*',
+]
+
+FAST_PREFS = {
+    'profile.managed_default_content_settings.images': 2,
+    'profile.managed_default_content_settings.stylesheets': 2,
+    'profile.managed_default_content_settings.fonts': 2,
+    'profile.managed_default_content_settings.notifications': 2,
+}
+
+
+def new_driver(headless=True, profile=None):
+    # Every driver is its own chromedriver + Chrome process
+    profile = profile or BROWSER_PROFILE
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument('--headless=new')
+    options.add_argument('--window-size=1920,1080')
+    if profile == 'fast':
+        # DOMContentLoaded is enough, the extractor waits for the selectors it needs
+        options.page_load_strategy = 'eager'
+        options.add_experimental_option('prefs', FAST_PREFS)
+        options.add_argument('--blink-settings=imagesEnabled=false')
+        options.add_argument('--disable-extensions')
+    driver = webdriver.Chrome(options=options)
+    if profile == 'fast':
+        # Prefs do not cover everything (fonts, trackers), CDP blocks the rest at the network layer
+        try:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URLS})
+        except Exception as e:
+            print('Could not enable request blocking:', e)
+    return driver
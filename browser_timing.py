@@ -0,0 +1,64 @@
+import sys
+import json
+import time
+import statistics
+import pandas as pd
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from browser import new_driver
+from extractor import PRODUCT_READY_CSS
+
+# Page load timings per browser profile, e.g.
+#   python browser_timing.py 10 > timings.json
+# 'full' waits like the old scraper did (readyState complete + [target="_blank"]),
+# 'fast' waits only for the extractor's selectors.
+
+TRANSFER_JS = '''
+let total = 0;
+for (const e of performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'))) {
+    total += e.transferSize || 0;
+}
+return [total, performance.getEntriesByType('resource').length];
+'''
+
+
+def time_profile(profile, links):
+    driver = new_driver(headless=True, profile=profile)
+    timings, transferred, requests = [], [], []
+    try:
+        for link in links:
+            start = time.perf_counter()
+            try:
+                driver.get(link)
+                if profile == 'full':
+                    WebDriverWait(driver, 20).until(lambda d: d.execute_script('return document.readyState') == 'complete')
+                    WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.CSS_SELECTOR, '[target="_blank"]')))
+                else:
+                    WebDriverWait(driver, 20, poll_frequency=0.1).until(EC.presence_of_element_located((By.CSS_SELECTOR, PRODUCT_READY_CSS)))
+            except Exception as e:
+                print(f'{profile}: {link} failed: {e}', file=sys.stderr)
+                continue
+            timings.append(time.perf_counter() - start)
+            size, count = driver.execute_script(TRANSFER_JS)
+            transferred.append(size)
+            requests.append(count)
+    finally:
+        driver.quit()
+    if not timings:
+        return {'pages': 0}
+    timings.sort()
+    return {
+        'pages': len(timings),
+        'mean_s': round(statistics.mean(timings), 3),
+        'p50_s': round(timings[len(timings) // 2], 3),
+        'p95_s': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        'mean_bytes': int(statistics.mean(transferred)),
+        'mean_requests': round(statistics.mean(requests), 1),
+    }
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    links = pd.read_csv('flipkart_product_links.csv')['product_links'].head(count).tolist()
+    print(json.dumps({profile: time_profile(profile, links) for profile in ('full', 'fast')}, indent=2))
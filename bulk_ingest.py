@@ -0,0 +1,103 @@
+import os
+import pandas as pd
+from canonical import product_key
+from product_store import INT_COLUMNS, FLOAT_COLUMNS, parse_number
+
+# Chunked bulk upload: the CSV is parsed INGEST_CHUNK rows at a time, each chunk is
+# validated and coerced, matched against the dataset's product-key -> row index (plus the
+# rows the upload added so far) and written as one batch of updates (known products) and
+# adds (new ones). The batches are folded into the store's frame once, after the last chunk,
+# so the work per chunk follows the size of the upload, not the size of the catalogue; only
+# an upload larger than INGEST_FOLD_ROWS is also folded in on the way, to bound the log
+# entries held pending in memory.
+
+INGEST_CHUNK = int(os.environ.get('BULK_UPLOAD_CHUNK', 5000))
+INGEST_FOLD_ROWS = int(os.environ.get('BULK_UPLOAD_FOLD_ROWS', 100000))
+MAX_REPORTED_ERRORS = 20
+# Retries of a chunk when another writer moved the catalogue underneath it
+MAX_ATTEMPTS = 3
+
+
+def _validate(chunk, columns, first_line):
+    # -> (rows, errors); rows are (key, {column: value}) with empty cells left out
+    rows, errors = [], []
+    known = [col for col in chunk.columns if col in columns]
+    for offset, record in enumerate(chunk[known].to_dict(orient='records')):
+        line = first_line + offset
+        row = {k: v.strip() for k, v in record.items() if isinstance(v, str) and v.strip()}
+        link = row.get('product_link', '')
+        key = product_key(link) if link else ''
+        if not key.split('|')[0]:
+            errors.append({'line': line, 'error': 'missing or invalid product_link'})
+            continue
+        bad = None
+        for col in INT_COLUMNS + FLOAT_COLUMNS:
+            if col in row:
+                try:
+                    row[col] = parse_number(row[col], col)
+                except ValueError:
+                    bad = col
+                    break
+        if bad:
+            errors.append({'line': line, 'error': f'invalid {bad}'})
+            continue
+        rows.append((key, row))
+    return rows, errors
+
+
+def ingest_csv(store, file, chunksize=INGEST_CHUNK):
+    # file: any readable CSV stream. Returns counts plus the first few rejected lines.
+    stats = {'added': 0, 'updated': 0, 'rejected': 0, 'errors': []}
+    columns = store.columns()
+    ds = store.current()
+    # Catalogue positions as of ds.seq, and the rows this upload added since
+    positions, seq, added = ds.keys.positions(), ds.seq, {}
+    unfolded = 0
+    line = 2  # first data line, after the header
+    try:
+        chunks = pd.read_csv(file, chunksize=chunksize, dtype=str, keep_default_na=False)
+    except pd.errors.EmptyDataError:
+        raise ValueError('Uploaded file is empty')
+    for chunk in chunks:
+        rows, errors = _validate(chunk, columns, line)
+        line += len(chunk)
+        stats['rejected'] += len(errors)
+        stats['errors'].extend(errors[:MAX_REPORTED_ERRORS - len(stats['errors'])])
+
+        for attempt in range(MAX_ATTEMPTS):
+            if attempt:
+                # Another writer moved the catalogue: positions are read again from its new version
+                store.refresh()
+                ds = store.current()
+                positions, seq, added = ds.keys.positions(), ds.seq, {}
+            updates, adds, added_keys, pending = {}, [], [], {}
+            for key, row in rows:
+                idx = added.get(key, positions.get(key))
+                if idx is not None:
+                    # Known product: merge into its pending update (last value wins)
+                    updates[idx] = dict(updates.get(idx, {}), **row)
+                elif key in pending:
+                    # Repeated inside this chunk: merge into the row about to be added
+                    adds[pending[key]].update(row)
+                else:
+                    pending[key] = len(adds)
+                    adds.append({col: row.get(col) for col in columns})
+                    added_keys.append(key)
+            # Positions are only trusted if nobody else wrote since the index was built
+            result = store.upsert(adds, list(updates.items()), expected_seq=seq)
+            if result is not None:
+                break
+        else:
+            raise RuntimeError('Catalogue kept changing during the upload, retry later')
+        # Our own batch was appended at result[0]: positions stay valid up to the new seq
+        start, seq = result
+        added.update(zip(added_keys, range(start, start + len(added_keys))))
+        stats['added'] += len(adds)
+        stats['updated'] += len(updates)
+        unfolded += len(adds) + len(updates)
+        if unfolded >= INGEST_FOLD_ROWS:
+            # Positions and added stay valid: the fold only applies what this upload wrote
+            store.refresh()
+            unfolded = 0
+    store.refresh()
+    return stats
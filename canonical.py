@@ -0,0 +1,51 @@
+import re
+from urllib.parse import urlsplit, urlunsplit, parse_qs, urlencode
+
+# Flipkart product links carry per-session tracking parameters (iid, ssid, srno, qH, ...).
+# A product is identified by its item id in the path plus the pid / lid parameters.
+
+ITM_RE = re.compile(r'/p/(itm[0-9a-zA-Z]+)')
+KEEP_PARAMS = ('pid', 'lid')
+# Links without escapes, fragment or odd characters: keyed with a few regex searches, which
+# gives the same key as urlsplit + parse_qs in a fraction of the time
+SIMPLE_LINK_RE = re.compile(r'[A-Za-z][A-Za-z0-9+.-]*://[^/?#\s\[\]]*(/[^?#\s]*)?\?([A-Za-z0-9_.~=&-]*)')
+PARAM_RES = [re.compile(rf'(?:^|&){name}=([^&]+)') for name in KEEP_PARAMS]
+
+
+def parse_product_link(link):
+    parts = urlsplit(link)
+    match = ITM_RE.search(parts.path)
+    query = parse_qs(parts.query)
+    itm = match.group(1) if match else ''
+    return (itm,) + tuple(query.get(name, [''])[0] for name in KEEP_PARAMS)
+
+
+def product_key(link):
+    # 'itm...|PID|LID', stable across search sessions
+    match = SIMPLE_LINK_RE.fullmatch(link)
+    if match is None:
+        return '|'.join(parse_product_link(link))
+    path, query = match.groups()
+    itm = ITM_RE.search(path or '')
+    params = [regex.search(query) for regex in PARAM_RES]
+    return '|'.join([itm.group(1) if itm else ''] + [m.group(1) if m else '' for m in params])
+
+
+def canonical_url(link):
+    parts = urlsplit(link)
+    query = parse_qs(parts.query)
+    kept = [(name, query[name][0]) for name in KEEP_PARAMS if query.get(name)]
+    return urlunsplit((parts.scheme or 'https', parts.netloc, parts.path, urlencode(kept), ''))
+
+
+def dedupe_links(links, seen=None):
+    # Canonical links in first-seen order, skipping products whose key is already in seen
+    seen = set() if seen is None else seen
+    unique = []
+    for link in links:
+        key = product_key(link)
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(canonical_url(link))
+    return unique
@@ -0,0 +1,91 @@
+import os
+import glob
+import hashlib
+import threading
+import numpy as np
+from metrics import cache_lookup
+
+# Distribution charts rendered from binned aggregates and cached as content-addressed
+# files: the name is a hash of dataset tag + chart parameters, so a file never changes
+# once written and concurrent requests can share it. matplotlib is imported on first render.
+
+CHART_CACHE_DIR = os.environ.get('CHART_CACHE_DIR', 'chart_cache')
+CHART_COLUMNS = {'price': 'Price', 'discount': 'Discount', 'avg_rating': 'Average Rating'}
+CHART_FORMATS = {'png': 'image/png', 'pdf': 'application/pdf', 'svg': 'image/svg+xml'}
+MAX_BINS = 200
+# Rendered files kept on disk, oldest are removed first
+MAX_CACHED_CHARTS = 200
+
+_bins_cache = {}
+_locks = {}
+_guard = threading.Lock()
+
+
+def chart_params(column='price', bins=20, fmt='pdf'):
+    if column not in CHART_COLUMNS:
+        raise ValueError(f"Unsupported column '{column}', use one of: {', '.join(CHART_COLUMNS)}")
+    if fmt not in CHART_FORMATS:
+        raise ValueError(f"Unsupported format '{fmt}', use one of: {', '.join(CHART_FORMATS)}")
+    return column, min(max(int(bins), 1), MAX_BINS), fmt
+
+
+def binned(ds, column, bins):
+    # (counts, edges) for the column, computed once per dataset tag
+    key = (ds.tag, column, bins)
+    with _guard:
+        cached = _bins_cache.get(key)
+    if cached is None:
+        values = ds.df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+        values = values[~np.isnan(values)]
+        cached = np.histogram(values, bins=bins)
+        with _guard:
+            # Only the current version's aggregates are worth keeping
+            for old in [k for k in _bins_cache if k[0] != ds.tag]:
+                del _bins_cache[old]
+            _bins_cache[key] = cached
+    return cached
+
+
+def _render(counts, edges, column, path, fmt):
+    # Figure without pyplot: no global state shared between request threads
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(8, 4))
+    ax = fig.add_subplot()
+    ax.stairs(counts, edges, fill=True)
+    ax.set_title(f'{CHART_COLUMNS[column]} Distribution')
+    ax.set_xlabel(CHART_COLUMNS[column])
+    ax.set_ylabel('Count')
+    fig.savefig(path, format=fmt)
+
+
+def _prune():
+    paths = sorted(glob.glob(os.path.join(CHART_CACHE_DIR, 'chart-*')), key=os.path.getmtime, reverse=True)
+    for path in paths[MAX_CACHED_CHARTS:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def chart_file(ds, column='price', bins=20, fmt='pdf'):
+    # Path of the rendered chart, rendering it only if no request did so before
+    column, bins, fmt = chart_params(column, bins, fmt)
+    digest = hashlib.sha256(f'{ds.tag}|{column}|{bins}|{fmt}'.encode('utf-8')).hexdigest()[:32]
+    path = os.path.join(CHART_CACHE_DIR, f'chart-{digest}.{fmt}')
+    if os.path.exists(path):
+        cache_lookup('chart', True)
+        return path
+    cache_lookup('chart', False)
+    os.makedirs(CHART_CACHE_DIR, exist_ok=True)
+    with _guard:
+        lock = _locks.setdefault(path, threading.Lock())
+    with lock:
+        if not os.path.exists(path):
+            counts, edges = binned(ds, column, bins)
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            _render(counts, edges, column, tmp_path, fmt)
+            os.replace(tmp_path, path)
+            _prune()
+    with _guard:
+        _locks.pop(path, None)
+    return path
@@ -0,0 +1,85 @@
+import os
+import glob
+import threading
+import xlsxwriter
+from product_store import to_records
+from metrics import cache_lookup
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are only shared between threads of one process
+    fcntl = None
+
+# Excel export cached on disk per dataset tag. The workbook is written row by row in
+# xlsxwriter's constant_memory mode and reused by every download until the data changes.
+
+EXPORT_CACHE_DIR = os.environ.get('EXPORT_CACHE_DIR', 'export_cache')
+EXPORT_CHUNK = 1000
+# Workbooks of older versions kept around for downloads still in flight
+KEEP_VERSIONS = 2
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def xlsx_path(ds):
+    return os.path.join(EXPORT_CACHE_DIR, f'products-{ds.tag}.xlsx')
+
+
+def write_xlsx(ds, path, chunk=EXPORT_CHUNK):
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'nan_inf_to_errors': True})
+    sheet = workbook.add_worksheet()
+    columns = list(ds.df.columns)
+    sheet.write_row(0, 0, columns, workbook.add_format({'bold': True, 'border': 1}))
+    row = 1
+    for start in range(0, len(ds.df), chunk):
+        for record in to_records(ds.df.iloc[start:start + chunk]):
+            sheet.write_row(row, 0, [record[col] for col in columns])
+            row += 1
+    workbook.close()
+
+
+def _prune(keep):
+    paths = sorted(glob.glob(os.path.join(EXPORT_CACHE_DIR, 'products-*.xlsx')), key=os.path.getmtime, reverse=True)
+    for path in paths[KEEP_VERSIONS:]:
+        if path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def build_xlsx(ds):
+    # Path of the workbook for ds; concurrent callers for the same tag wait for one build
+    path = xlsx_path(ds)
+    if os.path.exists(path):
+        cache_lookup('xlsx', True)
+        return path
+    cache_lookup('xlsx', False)
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+    with _locks_guard:
+        lock = _locks.setdefault(path, threading.Lock())
+    with lock:
+        if os.path.exists(path):
+            return path
+        with open(path + '.lock', 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # Another process may have finished it while we waited for the file lock
+                if not os.path.exists(path):
+                    tmp_path = f'{path}.{os.getpid()}.tmp'
+                    write_xlsx(ds, tmp_path)
+                    os.replace(tmp_path, path)
+                    _prune(keep=path)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        try:
+            os.remove(path + '.lock')
+        except OSError:
+            pass
+    with _locks_guard:
+        _locks.pop(path, None)
+    return path
@@ -0,0 +1,34 @@
+import io
+import os
+import json
+from flask import Response
+from product_store import to_records
+
+# Chunked exports: rows are serialized a chunk at a time from one Dataset, so memory
+# stays flat however big the catalogue is and the first bytes go out immediately.
+
+EXPORT_CHUNK = int(os.environ.get('EXPORT_CHUNK', 1000))
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def iter_ndjson(ds, rows, chunk=EXPORT_CHUNK):
+    for start in range(0, len(rows), chunk):
+        records = to_records(ds.df.iloc[rows[start:start + chunk]])
+        yield ''.join(json.dumps(record, default=str) + '\n' for record in records)
+
+
+def iter_csv(ds, rows, chunk=EXPORT_CHUNK):
+    yield ds.df.iloc[:0].to_csv(index=False)
+    for start in range(0, len(rows), chunk):
+        buffer = io.StringIO()
+        ds.df.iloc[rows[start:start + chunk]].to_csv(buffer, index=False, header=False)
+        yield buffer.getvalue()
+
+
+def export_response(ds, rows, fmt='csv', filename='flipkart_product_data'):
+    # ds pins one dataset version for the whole download, later mutations do not tear it
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{fmt}', use one of: {', '.join(EXPORT_FORMATS)}")
+    body = iter_ndjson(ds, rows) if fmt == 'ndjson' else iter_csv(ds, rows)
+    headers = {'Content-Disposition': f'attachment; filename={filename}.{fmt}', 'X-Accel-Buffering': 'no'}
+    return Response(body, mimetype=EXPORT_FORMATS[fmt], headers=headers)
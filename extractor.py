@@ -0,0 +1,116 @@
+import re
+import sys
+from urllib.parse import urljoin
+from lxml import etree, html as lxml_html
+
+# Declarative selectors for Flipkart pages. Every field lists its selectors in
+# fallback order; a selector is a CSS class (optionally with a tag) and what to read.
+
+def _class_xpath(css_class, tag='*'):
+    return etree.XPath(f"descendant-or-self::{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {css_class} ')]")
+
+
+def selector(css_class, tag='*', attr=None):
+    return {'xpath': _class_xpath(css_class, tag), 'attr': attr, 'name': f'{tag}.{css_class}'}
+
+
+PRODUCT_FIELDS = {
+    'status': [selector('Z8JjpR')],
+    'brand': [selector('mEh187')],
+    'title': [selector('VU-ZEz')],
+    'price': [selector('Nx9bqj')],
+    'discount': [selector('UkUFwK')],
+    'review_status': [selector('E3XX7J')],
+    'avg_rating': [selector('XQDdHH')],
+    'total_ratings': [selector('Wphh3N')],
+    'image_url': [selector('_396cs4', tag='img', attr='src'), selector('DByuf4', tag='img', attr='src')],
+}
+
+# Product cards on a search results page, first selector that matches wins
+PRODUCT_LINK_SELECTORS = [selector('rPDeLR', tag='a', attr='href'), selector('_1fQZEK', tag='a', attr='href')]
+
+# CSS selectors a browser waits for before page_source is read: the title, or the unavailable banner
+PRODUCT_READY_CSS = '.VU-ZEz, .Z8JjpR'
+SEARCH_READY_CSS = '.rPDeLR, ._1fQZEK'
+
+UNAVAILABLE_STATUSES = ('Currently Unavailable', 'Sold Out')
+REQUIRED_FIELDS = ('brand', 'title', 'price')
+
+
+class ExtractionError(Exception):
+    pass
+
+
+def parse_html(page_source):
+    return lxml_html.fromstring(page_source)
+
+
+def _read(node, attr):
+    if attr:
+        return (node.get(attr) or '').strip()
+    return ' '.join(node.text_content().split())
+
+
+def select_first(tree, selectors):
+    for sel in selectors:
+        for node in sel['xpath'](tree):
+            value = _read(node, sel['attr'])
+            if value:
+                return value
+    return None
+
+
+def select_all(tree, selectors):
+    for sel in selectors:
+        values = [_read(node, sel['attr']) for node in sel['xpath'](tree)]
+        values = [v for v in values if v]
+        if values:
+            return values
+    return []
+
+
+def extract_fields(tree):
+    return {name: select_first(tree, selectors) for name, selectors in PRODUCT_FIELDS.items()}
+
+
+def _digits(text):
+    return ''.join(re.findall(r'\d+', text or ''))
+
+
+def parse_product(page_source, product_page_link):
+    # Same result tuples as product_scraper.scrape_product
+    try:
+        tree = parse_html(page_source) if isinstance(page_source, (str, bytes)) else page_source
+        fields = extract_fields(tree)
+        if fields['status'] in UNAVAILABLE_STATUSES:
+            return ('unavailable', product_page_link)
+        missing = [name for name in REQUIRED_FIELDS if not fields[name]]
+        if missing:
+            raise ExtractionError(f"missing {', '.join(missing)}")
+        title = re.sub(r'\s*\([^)]*\)', '', fields['title'])  #removing data withing parenthesis (color information)
+        price = _digits(fields['price'])
+        discount = _digits(fields['discount'])
+        discount = int(discount) / 100 if discount else ''
+        #for a new product, there will be no avg_rating and total_ratings
+        avg_rating = ''
+        total_ratings = ''
+        if not fields['review_status'] and fields['avg_rating']:
+            avg_rating = fields['avg_rating']
+            total_ratings = fields['total_ratings'] or ''
+            total_ratings = int(total_ratings.split(' ')[0].replace(',', '')) if total_ratings else ''
+        image_url = fields['image_url'] or ''
+        return ('ok', [product_page_link, title, fields['brand'], price, discount, avg_rating, total_ratings, image_url])
+    except Exception as e:
+        return ('failed', product_page_link, str(e))
+
+
+def parse_product_links(page_source, base_url):
+    tree = parse_html(page_source) if isinstance(page_source, (str, bytes)) else page_source
+    return [urljoin(base_url, href) for href in select_all(tree, PRODUCT_LINK_SELECTORS)]
+
+
+if __name__ == '__main__':
+    # python extractor.py saved_page.html [...] -> parsed records, handy for checking selectors
+    for path in sys.argv[1:]:
+        with open(path, 'rb') as f:
+            print(path, parse_product(f.read(), path))
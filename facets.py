@@ -0,0 +1,192 @@
+import numpy as np
+import pandas as pd
+from metrics import stage_timer
+
+# Facet counts for the dashboard: brands, price/discount histograms and rating buckets.
+# Every row has one code per facet; the counts over the whole catalogue are kept per
+# dataset version and patched for changed rows, like SearchIndex.updated. Active filters
+# become row masks: a facet counts the rows matching every filter except its own, so a
+# selected brand still shows how many products the other brands have.
+
+# Bucket i is [edges[i], edges[i+1]), the last one is open ended
+PRICE_EDGES = [0, 250, 500, 750, 1000, 1500, 2000, 3000, 5000, 10000]
+DISCOUNT_EDGES = [0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9]
+RATING_EDGES = [0, 1, 2, 3, 4]
+# facet -> (column, edges, decimals the values are rounded to before bucketing)
+HISTOGRAMS = {
+    'price': ('price', PRICE_EDGES, 0),
+    'discount': ('discount', DISCOUNT_EDGES, 2),
+    'avg_rating': ('avg_rating', RATING_EDGES, 1),
+}
+# Filter that each facet ignores when it is counted
+OWN_FILTER = {'brand': 'brand', 'price': 'price'}
+MAX_BRANDS = 50
+# Above this share of changed rows the counts are recomputed instead of patched
+REBUILD_RATIO = 0.3
+
+
+def _bucket_codes(series, edges, decimals):
+    # Bucket index per row, len(edges) for missing values
+    values = pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    values = np.round(values, decimals)
+    codes = np.searchsorted(np.asarray(edges, dtype=np.float64), values, side='right') - 1
+    codes = np.clip(codes, 0, len(edges) - 1)
+    codes[np.isnan(values)] = len(edges)
+    return codes.astype(np.int16)
+
+
+def _price(value):
+    if value is None or value == '':
+        return None
+    return float(value)
+
+
+class FacetIndex:
+    def __init__(self, brands, brand_ids, codes, totals):
+        # brands: code -> name (code 0: no brand), codes: facet -> code per row, totals: facet -> counts
+        self.brands = brands
+        self.brand_ids = brand_ids
+        self.codes = codes
+        self.totals = totals
+        self.rows = len(next(iter(codes.values()))) if codes else 0
+
+    @staticmethod
+    def _brand_codes(df, brands, brand_ids):
+        # Names are stripped, so 'BRUTON ' and 'BRUTON' are one brand; new names extend brands in place
+        if 'brand' not in df.columns:
+            return np.zeros(len(df), dtype=np.int32)
+        column = df['brand']
+        if not isinstance(column.dtype, pd.CategoricalDtype):
+            column = column.astype('category')
+        lookup = [0]
+        for name in column.cat.categories:
+            name = str(name).strip()
+            if name not in brand_ids:
+                brand_ids[name] = len(brands)
+                brands.append(name)
+            lookup.append(brand_ids[name])
+        return np.asarray(lookup, dtype=np.int32)[column.cat.codes.to_numpy() + 1]
+
+    @staticmethod
+    def _codes(df, brands, brand_ids):
+        codes = {'brand': FacetIndex._brand_codes(df, brands, brand_ids)}
+        for facet, (column, edges, decimals) in HISTOGRAMS.items():
+            series = df[column] if column in df.columns else pd.Series(np.nan, index=df.index)
+            codes[facet] = _bucket_codes(series, edges, decimals)
+        return codes
+
+    @staticmethod
+    def _sizes(brands):
+        return dict({'brand': len(brands)}, **{facet: len(edges) + 1 for facet, (_, edges, _) in HISTOGRAMS.items()})
+
+    @classmethod
+    def build(cls, df):
+        brands, brand_ids = [None], {}
+        codes = cls._codes(df, brands, brand_ids)
+        sizes = cls._sizes(brands)
+        totals = {facet: np.bincount(c, minlength=sizes[facet]) for facet, c in codes.items()}
+        return cls(brands, brand_ids, codes, totals)
+
+    def updated(self, df, origin=None, fresh=None):
+        # Returns a new index for df, adjusting the totals only for rows whose codes changed.
+        # With origin/fresh (as in SearchIndex.updated) only the fresh rows are bucketed,
+        # without them every row is and rows are compared by position.
+        # The current index is left untouched for requests still using it.
+        brands, brand_ids = list(self.brands), dict(self.brand_ids)
+        if origin is not None:
+            return self._patched(df, origin, fresh, brands, brand_ids)
+        codes = self._codes(df, brands, brand_ids)
+        sizes = self._sizes(brands)
+        common = min(self.rows, len(df))
+        changed = np.zeros(common, dtype=bool)
+        for facet, new in codes.items():
+            changed |= self.codes[facet][:common] != new[:common]
+        changed = np.flatnonzero(changed)
+        if len(changed) + abs(self.rows - len(df)) > REBUILD_RATIO * max(len(df), 1):
+            totals = {facet: np.bincount(c, minlength=sizes[facet]) for facet, c in codes.items()}
+            return FacetIndex(brands, brand_ids, codes, totals)
+        totals = {}
+        for facet, new in codes.items():
+            old = self.codes[facet]
+            counts = np.zeros(sizes[facet], dtype=np.int64)
+            counts[:len(self.totals[facet])] = self.totals[facet]
+            counts -= np.bincount(np.concatenate([old[changed], old[common:]]), minlength=sizes[facet])
+            counts += np.bincount(np.concatenate([new[changed], new[common:]]), minlength=sizes[facet])
+            totals[facet] = counts
+        return FacetIndex(brands, brand_ids, codes, totals)
+
+    def _patched(self, df, origin, fresh, brands, brand_ids):
+        rows = np.flatnonzero(fresh)
+        fresh_codes = self._codes(df.iloc[rows], brands, brand_ids)
+        sizes = self._sizes(brands)
+        keep = ~fresh
+        # Old rows deleted or updated
+        gone = np.ones(self.rows, dtype=bool)
+        gone[origin[keep]] = False
+        codes, totals = {}, {}
+        for facet, old in self.codes.items():
+            new = np.empty(len(df), dtype=old.dtype)
+            new[keep] = old[origin[keep]]
+            new[rows] = fresh_codes[facet]
+            counts = np.zeros(sizes[facet], dtype=np.int64)
+            counts[:len(self.totals[facet])] = self.totals[facet]
+            counts -= np.bincount(old[gone], minlength=sizes[facet])
+            counts += np.bincount(fresh_codes[facet], minlength=sizes[facet])
+            codes[facet], totals[facet] = new, counts
+        return FacetIndex(brands, brand_ids, codes, totals)
+
+    def counts(self, facet, rows=None):
+        if rows is None:
+            return self.totals[facet]
+        return np.bincount(self.codes[facet][rows], minlength=len(self.totals[facet]))
+
+
+def _mask(rows, n):
+    mask = np.zeros(n, dtype=bool)
+    mask[rows] = True
+    return mask
+
+
+def _histogram(counts, edges):
+    buckets = [{'min': lo, 'max': hi, 'count': int(c)} for lo, hi, c in zip(edges, edges[1:] + [None], counts)]
+    return {'buckets': buckets, 'missing': int(counts[len(edges)])}
+
+
+def facet_counts(ds, brand=None, title=None, min_price=None, max_price=None, max_brands=MAX_BRANDS):
+    # Facets for the rows matching the same filters as /api/products
+    facets = ds.facets
+    n = len(ds.df)
+    with stage_timer('filter'):
+        masks = {}
+        for name, query in (('brand', brand), ('title', title)):
+            rows = ds.index.match(**{name: query})
+            if rows is not None:
+                masks[name] = _mask(rows, n)
+        min_price, max_price = _price(min_price), _price(max_price)
+        if min_price is not None or max_price is not None:
+            masks['price'] = _mask(ds.sorted.range('price', min_price, max_price), n)
+
+    combined = {}
+
+    def matching(exclude=None):
+        # Row ids in the AND of the active filter masks except one; None when nothing is filtered.
+        # Gathering codes by row id is several times faster than indexing them with the mask.
+        active = tuple(name for name in masks if name != exclude)
+        if active not in combined:
+            combined[active] = np.flatnonzero(np.logical_and.reduce([masks[name] for name in active])) if active else None
+        return combined[active]
+
+    with stage_timer('facets'):
+        everything = matching()
+        total = n if everything is None else len(everything)
+        brand_counts = facets.counts('brand', matching(OWN_FILTER.get('brand')))
+        # Code 0 is "no brand"
+        top = np.argsort(-brand_counts[1:], kind='stable')[:max_brands] + 1
+        result = {
+            'total': total,
+            'brands': [{'brand': facets.brands[code], 'count': int(brand_counts[code])} for code in top if brand_counts[code]],
+            'brand_count': int(np.count_nonzero(brand_counts[1:])),
+        }
+        for facet, (_, edges, _) in HISTOGRAMS.items():
+            result[facet] = _histogram(facets.counts(facet, matching(OWN_FILTER.get(facet))), edges)
+    return result
@@ -0,0 +1,221 @@
+import os
+import re
+import gzip
+import html
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, urlunsplit, parse_qs
+from canonical import parse_product_link
+
+# Local stand-in for www.flipkart.com serving saved pages, for offline scraper runs.
+# Product pages: any path with /p/<itm id> -> fixtures/pages/<itm id>.html
+# Search pages:  /search?q=...&page=N    -> fixtures/search/page-N.html
+# With a catalogue (see make_handler) products and search pages missing on disk are
+# generated from it instead, so runs can be as large as needed. Latency and 503s can be
+# injected to see how the scraper copes with a slow or flaky site.
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+GOLDEN_FILE = os.path.join(FIXTURE_DIR, 'golden.json')
+ITM_RE = re.compile(r'/p/(itm[0-9a-z]+)')
+SEARCH_PER_PAGE = 40
+# Every Nth generated product is listed but currently unavailable
+UNAVAILABLE_EVERY = 25
+
+PRODUCT_TEMPLATE = '''<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="utf-8"><title>{brand} {title}</title></head>
+<body>
+<div id="container">
+  <div class="_1YokD2 _2GoDe3">
+    <div class="_1YokD2 _3Mn1Gg col-5-12"><img loading="eager" class="DByuf4 IZexXJ jLEJ7H" alt="{title}" src="{image_url}"></div>
+    <div class="_1YokD2 _3Mn1Gg col-7-12">
+      <h1 class="_6EBuvT"><span class="mEh187">{brand} </span><span class="VU-ZEz">{title}&nbsp;&nbsp;(Black , 8)</span></h1>
+      {rating}
+      <div class="hl05eU"><div class="Nx9bqj CxhGGd">&#8377;{price}</div>{discount}</div>
+      {status}
+    </div>
+  </div>
+</div>
+</body>
+</html>
+'''
+RATING_HTML = ('<div class="_5OesEi HDvrBb"><span class="Y1HWO0"><div class="XQDdHH">{avg_rating}<img class="Rza2QY"></div></span>'
+               '<span class="Wphh3N"><span><span>{total_ratings:,} Ratings&nbsp;</span></span></span></div>')
+UNRATED_HTML = '<div class="_5OesEi"><span class="E3XX7J">Be the first to Review this product</span></div>'
+DISCOUNT_HTML = '<div class="UkUFwK WW8yVX"><span>{discount}% off</span></div>'
+UNAVAILABLE_HTML = '<div class="Z8JjpR">Currently Unavailable</div>'
+CARD_HTML = '<div class="cPHDOP col-12-12"><a class="rPDeLR" target="_blank" rel="noopener noreferrer" href="{href}">{brand}</a></div>'
+
+
+def _missing(value):
+    # None, NaN and pandas NA (which cannot be compared) all count as missing
+    return value is None or str(value) in ('', '<NA>', 'nan', 'NaN')
+
+
+def load_catalogue(df, unavailable_every=UNAVAILABLE_EVERY):
+    # Frame with the scraped CSV columns -> products in listing order, keyed by item id
+    products = []
+    for i, row in enumerate(df.to_dict(orient='records')):
+        itm = parse_product_link(row['product_link'])[0]
+        image_url = f'https://rukminim2.flixcart.com/image/832/832/{itm}.jpeg?q=70'
+        products.append(dict(row, itm=itm, image_url=image_url, unavailable=i % unavailable_every == unavailable_every - 1))
+    return products
+
+
+def golden_record(product):
+    # What extractor.parse_product should return for a generated page
+    if product['unavailable']:
+        return {'status': 'unavailable'}
+    rated = not _missing(product['avg_rating'])
+    return {'status': 'ok', 'row': {
+        'title': product['title'],
+        'brand': product['brand'],
+        'price': str(int(product['price'])),
+        'discount': '' if _missing(product['discount']) else round(float(product['discount']) * 100) / 100,
+        'avg_rating': str(float(product['avg_rating'])) if rated else '',
+        'total_ratings': int(product['total_ratings']) if rated else '',
+        'image_url': product['image_url'],
+    }}
+
+
+def load_golden(path=GOLDEN_FILE):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def render_product(product):
+    rated = not _missing(product['avg_rating'])
+    rating = RATING_HTML.format(avg_rating=float(product['avg_rating']), total_ratings=int(product['total_ratings'])) if rated else UNRATED_HTML
+    discount = '' if _missing(product['discount']) else DISCOUNT_HTML.format(discount=round(float(product['discount']) * 100))
+    return PRODUCT_TEMPLATE.format(
+        brand=html.escape(product['brand']), title=html.escape(product['title']), image_url=html.escape(product['image_url']),
+        price=f"{int(product['price']):,}", rating=rating, discount=discount,
+        status=UNAVAILABLE_HTML if product['unavailable'] else '')
+
+
+def render_search(products):
+    cards = []
+    for product in products:
+        parts = urlsplit(product['product_link'])
+        href = urlunsplit(('', '', parts.path, parts.query, ''))
+        cards.append(CARD_HTML.format(href=html.escape(href), brand=html.escape(product['brand'])))
+    return f'<!DOCTYPE html>\n<html><body><div id="container">{"".join(cards)}</div></body></html>\n'
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    fixture_dir = FIXTURE_DIR
+    # Seconds added to every response (+-50% jitter) and share of requests answered with 503
+    latency = 0.0
+    error_rate = 0.0
+    # Generated pages: products in listing order and the same keyed by item id
+    catalogue = None
+    by_itm = None
+    per_page = SEARCH_PER_PAGE
+
+    def log_message(self, format, *args):
+        pass
+
+    def _page_path(self, path):
+        match = ITM_RE.search(path)
+        if match:
+            return os.path.join(self.fixture_dir, 'pages', match.group(1) + '.html')
+        return None
+
+    def send_page(self, body, status=200):
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_response(status)
+            self.send_header('Content-Encoding', 'gzip')
+        else:
+            self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _product_page(self, path):
+        page_path = self._page_path(path)
+        if page_path and os.path.exists(page_path):
+            with open(page_path, 'rb') as f:
+                return f.read()
+        match = ITM_RE.search(path)
+        if match and self.by_itm and match.group(1) in self.by_itm:
+            return render_product(self.by_itm[match.group(1)]).encode('utf-8')
+        return None
+
+    def _search_page(self, query):
+        try:
+            page = int(query.get('page', ['1'])[0])
+        except ValueError:
+            return None
+        if self.catalogue is not None:
+            start = (page - 1) * self.per_page
+            products = self.catalogue[start:start + self.per_page]
+            return render_search(products).encode('utf-8') if products and page >= 1 else None
+        page_path = os.path.join(self.fixture_dir, 'search', f'page-{page}.html')
+        if os.path.exists(page_path):
+            with open(page_path, 'rb') as f:
+                return f.read()
+        return None
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency * random.uniform(0.5, 1.5))
+        if self.error_rate and random.random() < self.error_rate:
+            self.send_page(b'<html><body><h1>Service Unavailable</h1></body></html>', status=503)
+            return
+        parts = urlsplit(self.path)
+        if parts.path.rstrip('/') == '/search':
+            body = self._search_page(parse_qs(parts.query))
+        else:
+            body = self._product_page(parts.path)
+        if body is None:
+            self.send_page(b'<html><body><h1>Not Found</h1></body></html>', status=404)
+            return
+        self.send_page(body)
+
+
+def make_handler(latency=0.0, error_rate=0.0, catalogue=None, per_page=SEARCH_PER_PAGE):
+    # FixtureHandler subclass with its own settings, so several sites can run side by side
+    by_itm = {product['itm']: product for product in catalogue} if catalogue else None
+    return type('ConfiguredFixtureHandler', (FixtureHandler,), {
+        'latency': latency, 'error_rate': error_rate, 'catalogue': catalogue, 'by_itm': by_itm, 'per_page': per_page})
+
+
+def search_urls(base_url, pages, query='sports shoes for men'):
+    q = query.replace(' ', '+')
+    return [f'{base_url}/search?q={q}&page={page}' for page in range(1, pages + 1)]
+
+
+def serve(port=0, handler=FixtureHandler):
+    # Starts the fixture site in a background thread, returns (server, base_url)
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def localize(link, base_url):
+    # https://www.flipkart.com/x/p/itm..?pid=.. -> http://127.0.0.1:port/x/p/itm..?pid=..
+    parts, base = urlsplit(link), urlsplit(base_url)
+    return urlunsplit((base.scheme, base.netloc, parts.path, parts.query, ''))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve saved (or generated) Flipkart pages locally')
+    parser.add_argument('port', nargs='?', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to each response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with 503')
+    parser.add_argument('--products', type=int, default=0, help='serve a generated catalogue of this many products')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    catalogue = None
+    if args.products:
+        from bench_data import synthetic_rows
+        catalogue = load_catalogue(synthetic_rows(args.products, args.seed))
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(args.latency, args.error_rate, catalogue))
+    print(f"Serving Flipkart fixtures from {FIXTURE_DIR} on http://127.0.0.1:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,67 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from extractor import parse_product
+from run_log import stage
+from scrape_workers import scrape_results, summarize, DETAIL_WORKERS
+
+# Parallel keep-alive requests for product pages
+HTTP_CONCURRENCY = int(os.environ.get('HTTP_CONCURRENCY', 8))
+HTTP_TIMEOUT = 15
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml',
+    'Accept-Language': 'en-IN,en;q=0.9',
+    'Accept-Encoding': 'gzip, deflate',
+}
+
+
+def new_session(concurrency=HTTP_CONCURRENCY, retry=True):
+    # One pooled session shared by all fetch threads: connections are kept alive and reused.
+    # retry=False sends every request exactly once, for callers that rate limit each request.
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    retry = Retry(total=2, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504)) if retry else Retry(0, read=False)
+    adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def fetch_product(session, product_page_link, timeout=HTTP_TIMEOUT):
+    try:
+        with stage('navigate', url=product_page_link, via='http'):
+            response = session.get(product_page_link, timeout=timeout)
+        if response.status_code != 200:
+            return ('failed', product_page_link, f'HTTP {response.status_code}')
+        # requests already undid gzip/deflate, the bytes go straight to lxml
+        with stage('extract', url=product_page_link):
+            return parse_product(response.content, product_page_link)
+    except Exception as e:
+        return ('failed', product_page_link, str(e))
+
+
+def scrape_products_http(links, concurrency=HTTP_CONCURRENCY, fallback=True, workers=DETAIL_WORKERS, session=None, on_result=None):
+    # (product rows, unavailable links, failed count) like scrape_workers.summarize. Pages that fail over HTTP
+    # (blocked, or parse did not find brand/title/price) are retried in the browser.
+    session = session or new_session(concurrency)
+
+    def fetch(link):
+        result = fetch_product(session, link)
+        if on_result is not None and (result[0] != 'failed' or not fallback):
+            on_result(link, result)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        results = list(pool.map(fetch, links))
+
+    retry_at = [i for i, r in enumerate(results) if r[0] == 'failed']
+    print(f"HTTP fetch: {len(links) - len(retry_at)}/{len(links)} pages parsed", flush=True)
+    if fallback and retry_at:
+        print(f"Falling back to the browser for {len(retry_at)} pages", flush=True)
+        retried = scrape_results([links[i] for i in retry_at], workers=min(workers, len(retry_at)), on_result=on_result)
+        for i, result in zip(retry_at, retried):
+            results[i] = result
+    return summarize(results)
@@ -0,0 +1,60 @@
+import threading
+import numpy as np
+from canonical import product_key
+
+# product_key -> row position, for matching uploaded or scraped rows to catalogue products.
+# Parsing every link is the expensive part, so it is only done on first use and then carried
+# from version to version: only the links of rows added or updated since are parsed again.
+
+
+def _key(link):
+    return product_key(link) if isinstance(link, str) and link else ''
+
+
+class KeyIndex:
+    def __init__(self, df, keys=None, positions=None):
+        self._df = df
+        # Key of every row ('' without a link), None until first used
+        self._keys = keys
+        self._positions = positions
+        self._lock = threading.Lock()
+        self.rows = len(df)
+
+    @classmethod
+    def build(cls, df):
+        return cls(df)
+
+    def positions(self):
+        # key -> position; with duplicate keys the last row wins
+        if self._positions is None:
+            with self._lock:
+                if self._positions is None:
+                    if self._keys is None:
+                        links = self._df['product_link'].tolist() if 'product_link' in self._df.columns else []
+                        self._keys = [_key(link) for link in links] + [''] * (self.rows - len(links))
+                    self._positions = {key: pos for pos, key in enumerate(self._keys) if key}
+        return self._positions
+
+    def updated(self, df, origin=None, fresh=None):
+        # New index for df, origin/fresh as in SearchIndex.updated. Left unbuilt if this one
+        # never was, or when there is nothing to carry the keys over with.
+        if self._keys is None or origin is None:
+            return KeyIndex(df)
+        positions = self.positions()
+        keys = self._keys
+        rows = np.flatnonzero(fresh).tolist()
+        links = df['product_link'].iloc[rows].tolist() if 'product_link' in df.columns else [None] * len(rows)
+        new_keys = dict(zip(rows, map(_key, links)))
+        old = len(keys)
+        if len(origin) >= old and np.array_equal(origin[:old], np.arange(old)):
+            if all(new_keys[pos] == keys[pos] for pos in rows if pos < old):
+                # Only appended rows and updates that kept their link: extend a copy
+                added = [new_keys[pos] for pos in range(old, len(origin))]
+                positions = dict(positions)
+                for pos, key in enumerate(added, old):
+                    if key:
+                        positions[key] = pos
+                return KeyIndex(df, keys + added, positions)
+        # Deletes or changed links move keys around: the map is rebuilt from the moved keys
+        keys = [new_keys[pos] if pos in new_keys else keys[src] for pos, src in enumerate(origin.tolist())]
+        return KeyIndex(df, keys)
@@ -0,0 +1,150 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# In-process metrics in the Prometheus text format, no client library needed.
+# instrument(app) adds per-route latency histograms and a /metrics endpoint;
+# stage_timer('filter') times a block into the stage histogram.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f'{self.name}{_label_text(k)} {v}' for k, v in items]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{_label_text(key + (("le", le),))} {cumulative}')
+            lines.append(f'{self.name}_sum{_label_text(key)} {total}')
+            lines.append(f'{self.name}_count{_label_text(key)} {count}')
+        return lines
+
+
+REGISTRY = []
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Request latency by app, route, method and status.')
+STAGE_LATENCY = Histogram('stage_duration_seconds', 'Time spent in each stage of request handling (load, filter, sort, paginate, serialize, compress).')
+CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups by cache and result (hit/miss).')
+CACHE_HIT_RATIO = Gauge('cache_hit_ratio', 'Hits / lookups per cache since start.')
+DATASET_VERSION = Gauge('dataset_version', 'Version of the product dataset currently served.')
+DATASET_ROWS = Gauge('dataset_rows', 'Rows in the product dataset currently served.')
+DATASET_LOG_SEQ = Gauge('dataset_log_seq', 'Last mutation log entry applied to the served dataset.')
+
+
+@contextmanager
+def stage_timer(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage=stage)
+
+
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def render():
+    # Ratios are derived from the counters at scrape time
+    caches = {dict(k)['cache'] for k in list(CACHE_REQUESTS._values)}
+    for cache in caches:
+        hits, misses = CACHE_REQUESTS.value(cache=cache, result='hit'), CACHE_REQUESTS.value(cache=cache, result='miss')
+        CACHE_HIT_RATIO.set(round(hits / (hits + misses), 4) if hits + misses else 0, cache=cache)
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def instrument(app, name=None):
+    # Latency histogram for every route of app, plus GET /metrics.
+    # Streamed responses are timed up to their headers.
+    from flask import Response, request
+    name = name or app.import_name
+
+    @app.before_request
+    def _start_timer():
+        request._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_latency(response):
+        start = getattr(request, '_metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            REQUEST_LATENCY.observe(time.perf_counter() - start, app=name, route=route,
+                                    method=request.method, status=response.status_code)
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return Response(render(), mimetype='text/plain; version=0.0.4')
+
+    return app
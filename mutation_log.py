@@ -0,0 +1,113 @@
+import os
+import json
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialized
+    fcntl = None
+
+# Append-only JSON lines log of product mutations, replayed on top of the base CSV:
+#   {"seq": 7, "op": "add", "rows": [{...}, ...]}
+#   {"seq": 8, "op": "update", "idx": 3, "row": {...}}
+#   {"seq": 9, "op": "update_many", "updates": [[3, {...}], [5, {...}], ...]}
+#   {"seq": 10, "op": "delete", "idx": 3}
+#   {"seq": 11, "op": "checkpoint", "upto": 10, "base": [mtime_ns, size]}
+# A checkpoint says the base file with that stat already contains every entry up to 'upto'.
+# The first write against a base file records one too, so when the file is replaced without
+# a matching checkpoint (e.g. rewritten by a scrape) the positions in the log are not replayed
+# on it.
+
+LOG_FILE = 'flipkart_product_data.log'
+# Entries since the last checkpoint before a background compaction is started
+COMPACT_THRESHOLD = int(os.environ.get('PRODUCT_LOG_COMPACT_THRESHOLD', 1000))
+
+
+class MutationLog:
+    def __init__(self, path=LOG_FILE):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self.seq = 0
+        self._offset = 0
+        self._inode = None
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+
+    @contextmanager
+    def writer(self):
+        # Single writer across threads and (where fcntl exists) processes
+        with self._thread_lock:
+            if self._depth or fcntl is None:
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def reset(self):
+        # Next read_new() starts again from the beginning of the file
+        self._offset = 0
+        self._inode = None
+
+    def read_new(self):
+        # Complete entries appended since the last call, restarting if the log was rewritten
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self.reset()
+            return []
+        if st.st_ino != self._inode or st.st_size < self._offset:
+            self._offset = 0
+            self._inode = st.st_ino
+        if st.st_size == self._offset:
+            return []
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        self._offset += end
+        entries = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+        for entry in entries:
+            self.seq = max(self.seq, entry['seq'])
+        return entries
+
+    def append(self, entry):
+        # Caller holds writer(); one line, flushed and fsynced before returning
+        return self.append_many([entry])[0]
+
+    def append_many(self, entries):
+        # Caller holds writer(); consecutive seqs, written with a single fsync
+        entries = [dict(entry, seq=self.seq + i) for i, entry in enumerate(entries, 1)]
+        data = ''.join(json.dumps(entry, default=str) + '\n' for entry in entries)
+        with open(self.path, 'ab') as f:
+            f.write(data.encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        return entries
+
+    def truncate(self, upto):
+        # Caller holds writer(); drops entries already folded into the base file
+        kept = []
+        try:
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    if line.strip() and json.loads(line)['seq'] > upto:
+                        kept.append(line)
+        except FileNotFoundError:
+            return
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.writelines(kept)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
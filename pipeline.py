@@ -0,0 +1,253 @@
+import os
+import csv
+import time
+import queue
+import threading
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from browser import new_driver
+from canonical import product_key, canonical_url
+from extractor import parse_product_links, SEARCH_READY_CSS
+from http_fetch import new_session, fetch_product, HTTP_CONCURRENCY
+from product_scraper import scrape_product, PRODUCT_COLUMNS
+from scrape_state import REFRESH_AFTER_HOURS
+from scrape_workers import DETAIL_WORKERS, MAX_ATTEMPTS, _driver_alive
+from run_log import stage
+
+# Streaming scrape: results pages -> bounded link queue -> detail workers -> batched writer.
+# Links are scraped while pagination is still running and rows reach disk in small
+# batches, so memory does not grow with the size of the run.
+
+PAGE_WORKERS = int(os.environ.get('PAGE_WORKERS', 2))
+# Producers block when detail workers fall this far behind
+LINK_QUEUE_SIZE = 200
+WRITE_BATCH = 50
+FLUSH_SECONDS = 2.0
+DUPLICATE_SUBSET = ['brand', 'price', 'discount', 'avg_rating', 'total_ratings']
+
+_DONE = object()
+
+
+class _CsvSink:
+    # Appends rows to <path>.partial and renames it over <path> when closed
+    def __init__(self, path, header):
+        self.path = path
+        self.partial_path = path + '.partial'
+        self._file = open(self.partial_path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(header)
+        self._buffer = []
+        self.count = 0
+
+    def add(self, row):
+        self._buffer.append(row)
+        self.count += 1
+
+    def flush(self):
+        if self._buffer:
+            self._writer.writerows(self._buffer)
+            self._buffer.clear()
+            self._file.flush()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+        os.replace(self.partial_path, self.path)
+
+
+def _quit(driver):
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+def run_pipeline(pagination_links, state, detail_workers=DETAIL_WORKERS, page_workers=PAGE_WORKERS,
+                 fetch_mode='http', http_concurrency=HTTP_CONCURRENCY, max_products=None,
+                 max_age_hours=REFRESH_AFTER_HOURS, failed_only=False, browser_profile=None,
+                 data_file='flipkart_product_data.csv', links_file='flipkart_product_links.csv',
+                 unavailable_file='unavailable_products.csv', duplicates_file='duplicate_products.csv'):
+    pages = queue.Queue()
+    for page_url in pagination_links:
+        pages.put(page_url)
+    links = queue.Queue(maxsize=LINK_QUEUE_SIZE)
+    results = queue.Queue(maxsize=LINK_QUEUE_SIZE)
+    session = new_session(max(http_concurrency, detail_workers + page_workers))
+    seen = set()
+    seen_lock = threading.Lock()
+    stats = {'pages': 0, 'links': 0, 'fresh': 0, 'scraped': 0, 'failed': 0}
+
+    def page_links(page_url, driver_box):
+        found = []
+        if fetch_mode == 'http':
+            try:
+                with stage('navigate', url=page_url, via='http', page='results'):
+                    response = session.get(page_url, timeout=15)
+                if response.status_code == 200:
+                    with stage('extract', url=page_url, page='results'):
+                        found = parse_product_links(response.content, page_url)
+            except Exception as e:
+                print(f"HTTP fetch of {page_url} failed: {e}")
+        if not found:
+            if driver_box[0] is None:
+                driver_box[0] = new_driver(profile=browser_profile)
+            driver = driver_box[0]
+            with stage('navigate', url=page_url, via='browser', page='results'):
+                driver.get(page_url)
+            try:
+                with stage('wait', url=page_url, page='results'):
+                    WebDriverWait(driver, 10, poll_frequency=0.1).until(EC.presence_of_element_located((By.CSS_SELECTOR, SEARCH_READY_CSS)))
+            except Exception:
+                print('No product cards (rPDeLR / _1fQZEK) found on', page_url)
+            with stage('extract', url=page_url, page='results'):
+                found = parse_product_links(driver.page_source, page_url)
+        return found
+
+    def page_worker():
+        # Producer: pushes each new product link as soon as its results page is parsed
+        driver_box = [None]
+        try:
+            while True:
+                try:
+                    page_url = pages.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    found = page_links(page_url, driver_box)
+                except Exception as e:
+                    print(f"Failed to process {page_url}: {e}")
+                    continue
+                print(f"{page_url} Done ------> Found {len(found)} products")
+                for link in found:
+                    link = canonical_url(link)
+                    if failed_only and state.lookup(link) is None:
+                        # Never scraped: there is no failed attempt to retry, and it is not
+                        # known to be unavailable either, so it is left out of this run
+                        continue
+                    with seen_lock:
+                        key = product_key(link)
+                        if key in seen or (max_products and len(seen) >= max_products):
+                            continue
+                        seen.add(key)
+                        stats['links'] += 1
+                    results.put(('link', link))
+                    if state.needs_scrape(link, max_age_hours, failed_only):
+                        links.put(link)
+                    else:
+                        results.put(('fresh', link))
+                with seen_lock:
+                    stats['pages'] += 1
+        finally:
+            if driver_box[0] is not None:
+                _quit(driver_box[0])
+
+    def detail_worker():
+        # Consumer: HTTP first, a lazily started browser for pages that fail to parse
+        driver = None
+        try:
+            while True:
+                link = links.get()
+                if link is _DONE:
+                    return
+                result = fetch_product(session, link) if fetch_mode == 'http' else ('failed', link, 'browser mode')
+                if result[0] == 'failed':
+                    # Retried here rather than put back on the bounded links queue, which
+                    # could block every detail worker on its own queue
+                    for _ in range(MAX_ATTEMPTS):
+                        try:
+                            if driver is None:
+                                driver = new_driver(profile=browser_profile)
+                            result = scrape_product(driver, link)
+                        except Exception as e:
+                            result = ('failed', link, str(e))
+                        if result[0] != 'failed' or (driver is not None and _driver_alive(driver)):
+                            # A page that did not parse keeps its browser warm for the next link
+                            break
+                        # Browser crashed (or never started): replace it and try the link again
+                        print(f"Browser lost on {link}, restarting")
+                        if driver is not None:
+                            _quit(driver)
+                        driver = None
+                results.put(('result', link, result))
+        finally:
+            if driver is not None:
+                _quit(driver)
+
+    def writer():
+        # Single writer: checkpoints every result and flushes rows to disk in batches
+        data = _CsvSink(data_file, PRODUCT_COLUMNS)
+        link_rows = _CsvSink(links_file, ['product_links'])
+        unavailable = _CsvSink(unavailable_file, ['link'])
+        duplicates = _CsvSink(duplicates_file, PRODUCT_COLUMNS)
+        sinks = [data, link_rows, unavailable, duplicates]
+        dup_keys = set()
+        dup_idx = [PRODUCT_COLUMNS.index(col) for col in DUPLICATE_SUBSET]
+        last_flush = time.time()
+
+        def add_row(row):
+            key = tuple(str(row[i]) for i in dup_idx)
+            if key in dup_keys:
+                duplicates.add(row)
+            else:
+                dup_keys.add(key)
+                data.add(row)
+
+        while True:
+            try:
+                item = results.get(timeout=FLUSH_SECONDS)
+            except queue.Empty:
+                item = None
+            if item is _DONE:
+                break
+            if item is not None:
+                try:
+                    kind, link = item[0], item[1]
+                    if kind == 'link':
+                        link_rows.add([link])
+                    elif kind == 'fresh':
+                        stats['fresh'] += 1
+                        entry = state.lookup(link)
+                        if entry and entry['row']:
+                            add_row(entry['row'])
+                        else:
+                            unavailable.add([link])
+                    else:
+                        result = item[2]
+                        state.record(link, result)
+                        stats['scraped'] += 1
+                        if result[0] == 'ok':
+                            add_row(result[1])
+                        else:
+                            stats['failed'] += result[0] == 'failed'
+                            unavailable.add([link])
+                        print(f"URL {stats['scraped']} completed {'*******' if result[0] == 'ok' else '--->'}")
+                except Exception as e:
+                    print(f"Writer could not handle {item[:2]}: {e}")
+            if any(len(s._buffer) >= WRITE_BATCH for s in sinks) or time.time() - last_flush >= FLUSH_SECONDS:
+                pending = sum(len(s._buffer) for s in sinks)
+                if pending:
+                    with stage('write', rows=pending):
+                        for sink in sinks:
+                            sink.flush()
+                last_flush = time.time()
+        with stage('write', rows=sum(len(s._buffer) for s in sinks)):
+            for sink in sinks:
+                sink.close()
+        stats.update(products=data.count, unavailable=unavailable.count, duplicates=duplicates.count)
+
+    writer_thread = threading.Thread(target=writer, name='pipeline-writer')
+    detail_threads = [threading.Thread(target=detail_worker, name=f'pipeline-detail-{i}') for i in range(max(1, detail_workers))]
+    page_threads = [threading.Thread(target=page_worker, name=f'pipeline-page-{i}') for i in range(max(1, page_workers))]
+    writer_thread.start()
+    for t in detail_threads + page_threads:
+        t.start()
+    for t in page_threads:
+        t.join()
+    for _ in detail_threads:
+        links.put(_DONE)
+    for t in detail_threads:
+        t.join()
+    results.put(_DONE)
+    writer_thread.join()
+    return stats
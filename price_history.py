@@ -0,0 +1,339 @@
+import os
+import json
+import mmap
+import time
+import hashlib
+import threading
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from canonical import product_key
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialized
+    fcntl = None
+
+# Append-only price history across scrape runs, keyed by canonical.product_key.
+# A run writes one record per product whose values changed since its previous record,
+# holding only the changed fields as zigzag varint deltas (missing counts as 0):
+#   varint run | varint slot | varint previous record offset + 1 (0: first record)
+#   | uint8 changed | uint8 appeared (was missing) | uint8 gone (now missing)
+#   | [varint key length + key, first record only] | varint delta per changed field
+# Records of one product are chained backwards, so its history is a walk down one chain.
+# The .idx file maps sorted key hashes to slot, latest record offset and latest values.
+# It is replaced atomically after each run and is the commit point: data past its size is a torn run.
+
+HISTORY_FILE = os.environ.get('PRICE_HISTORY_FILE', 'price_history.bin')
+# Stored as integers: value * scale
+FIELDS = [('price', 1), ('discount', 100), ('avg_rating', 10), ('total_ratings', 1), ('available', 1)]
+FIELD_NAMES = [name for name, _ in FIELDS]
+MISSING = np.iinfo(np.int64).min
+MAX_DROPS = 100
+
+_Index = namedtuple('_Index', ['hashes', 'slots', 'offsets', 'values', 'runs', 'data_size', 'data'])
+
+
+def key_hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _scaled(column, scale):
+    values = pd.to_numeric(column, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan) * scale
+    return np.where(np.isnan(values), MISSING, np.round(np.nan_to_num(values))).astype(np.int64)
+
+
+def _unscaled(value, scale):
+    if value == MISSING:
+        return None
+    return value if scale == 1 else value / scale
+
+
+def _put_varint(buf, n):
+    while n >= 0x80:
+        buf.append((n & 0x7f) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+
+def _get_varint(data, pos):
+    result = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        result |= (b & 0x7f) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _zigzag(n):
+    return n << 1 if n >= 0 else ((-n) << 1) - 1
+
+
+def _unzigzag(n):
+    return n >> 1 if not n & 1 else -((n + 1) >> 1)
+
+
+def _z(value):
+    return 0 if value == MISSING else value
+
+
+def encode_record(run, slot, prev_offset, old, new, key=None):
+    # old/new: scaled values per field, None in new for a field not observed this run
+    changed = appeared = gone = 0
+    deltas = []
+    for i, value in enumerate(new):
+        if value is None or value == old[i]:
+            continue
+        changed |= 1 << i
+        appeared |= (old[i] == MISSING) << i
+        gone |= (value == MISSING) << i
+        deltas.append(_z(value) - _z(old[i]))
+    if not changed:
+        return None
+    buf = bytearray()
+    _put_varint(buf, run)
+    _put_varint(buf, slot)
+    _put_varint(buf, 0 if prev_offset < 0 else prev_offset + 1)
+    buf += bytes((changed, appeared, gone))
+    if prev_offset < 0:
+        raw = key.encode('utf-8')
+        _put_varint(buf, len(raw))
+        buf += raw
+    for d in deltas:
+        _put_varint(buf, _zigzag(d))
+    return bytes(buf)
+
+
+def decode_record(data, pos):
+    # -> (run, slot, previous offset or -1, key or None, {field index: (delta, appeared, gone)}, next pos)
+    run, pos = _get_varint(data, pos)
+    slot, pos = _get_varint(data, pos)
+    prev, pos = _get_varint(data, pos)
+    changed, appeared, gone = data[pos], data[pos + 1], data[pos + 2]
+    pos += 3
+    key = None
+    if not prev:
+        length, pos = _get_varint(data, pos)
+        key = bytes(data[pos:pos + length]).decode('utf-8')
+        pos += length
+    fields = {}
+    for i in range(len(FIELDS)):
+        if changed >> i & 1:
+            d, pos = _get_varint(data, pos)
+            fields[i] = (_unzigzag(d), appeared >> i & 1, gone >> i & 1)
+    return run, slot, prev - 1, key, fields, pos
+
+
+def observed_values(df, unavailable=()):
+    # key -> scaled values for one run; unavailable products only report availability
+    df = df.reindex(columns=['product_link'] + FIELD_NAMES[:-1])
+    scaled = np.column_stack([_scaled(df[name], scale) for name, scale in FIELDS[:-1]] + [np.ones(len(df), dtype=np.int64)])
+    observed = {}
+    for link, values in zip(df['product_link'].tolist(), scaled.tolist()):
+        if isinstance(link, str) and link:
+            observed[product_key(link)] = values
+    for link in unavailable:
+        observed[product_key(link)] = [None] * (len(FIELDS) - 1) + [0]
+    return observed
+
+
+class PriceHistory:
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self.index_path = path + '.idx'
+        self.runs_path = path + '.runs'
+        self.lock_path = path + '.lock'
+        self._state = None
+        self._stat = None
+        self._drops = {}
+        self._lock = threading.Lock()
+
+    def _read_index(self):
+        try:
+            with np.load(self.index_path) as idx:
+                hashes, slots, offsets, values = idx['hashes'], idx['slots'], idx['offsets'], idx['values']
+                runs_count, data_size = (int(v) for v in idx['meta'])
+        except FileNotFoundError:
+            hashes = np.zeros(0, dtype=np.uint64)
+            slots = offsets = np.zeros(0, dtype=np.int64)
+            values = np.zeros((0, len(FIELDS)), dtype=np.int64)
+            runs_count = data_size = 0
+        runs = []
+        if runs_count:
+            with open(self.runs_path, encoding='utf-8') as f:
+                runs = [json.loads(line) for line in f if line.strip()][:runs_count]
+        data = b''
+        if data_size:
+            with open(self.path, 'rb') as f:
+                data = mmap.mmap(f.fileno(), data_size, access=mmap.ACCESS_READ)
+        return _Index(hashes, slots, offsets, values, runs, data_size, data)
+
+    def refresh(self):
+        # Reload when the index was replaced by a newer run
+        try:
+            st = os.stat(self.index_path)
+            stat = (st.st_mtime_ns, st.st_size, st.st_ino)
+        except FileNotFoundError:
+            stat = None
+        if stat == self._stat and self._state is not None:
+            return self._state
+        with self._lock:
+            if stat != self._stat or self._state is None:
+                self._state = self._read_index()
+                self._stat = stat
+                self._drops = {}
+        return self._state
+
+    def _slot(self, state, key):
+        h = np.uint64(key_hash(key))
+        pos = int(np.searchsorted(state.hashes, h))
+        if pos < len(state.hashes) and state.hashes[pos] == h:
+            return int(state.slots[pos])
+        return None
+
+    # --- Writes: one run at a time under a file lock ---
+    def _writer_lock(self):
+        lock_file = open(self.lock_path, 'a')
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def record_run(self, df, unavailable=(), at=None):
+        # df: product rows of this run (product_link + FIELDS), unavailable: links seen as unavailable
+        lock_file = self._writer_lock()
+        try:
+            with self._lock:
+                self._stat = None
+            state = self.refresh()
+            run = len(state.runs) + 1
+            observed = observed_values(df, unavailable)
+            slot_of = dict(zip(state.hashes.tolist(), state.slots.tolist()))
+            offsets = state.offsets.tolist()
+            values = state.values.tolist()
+            new_hashes, new_slots = [], []
+            buf = bytearray()
+            changed = 0
+            for key, new in observed.items():
+                h = key_hash(key)
+                slot = slot_of.get(h)
+                if slot is None:
+                    slot = slot_of[h] = len(offsets)
+                    new_hashes.append(h)
+                    new_slots.append(slot)
+                    offsets.append(-1)
+                    values.append([MISSING] * len(FIELDS))
+                record = encode_record(run, slot, offsets[slot], values[slot], new, key)
+                if record is None:
+                    continue
+                offsets[slot] = state.data_size + len(buf)
+                values[slot] = [old if v is None else v for old, v in zip(values[slot], new)]
+                buf += record
+                changed += 1
+
+            # Drop a torn run left behind by a crash before appending after it
+            with open(self.path, 'ab') as f:
+                f.truncate(state.data_size)
+                f.write(buf)
+                f.flush()
+                os.fsync(f.fileno())
+            data_size = state.data_size + len(buf)
+            entry = {'run': run, 'at': time.time() if at is None else at, 'products': len(observed),
+                     'changed': changed, 'bytes': len(buf)}
+            tmp_path = f'{self.runs_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(r) + '\n' for r in state.runs + [entry])
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.runs_path)
+
+            hashes = np.concatenate([state.hashes, np.array(new_hashes, dtype=np.uint64)])
+            slots = np.concatenate([state.slots, np.array(new_slots, dtype=np.int64)])
+            order = np.argsort(hashes, kind='stable')
+            tmp_path = f'{self.index_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, hashes=hashes[order], slots=slots[order], offsets=np.array(offsets, dtype=np.int64),
+                         values=np.array(values, dtype=np.int64).reshape(-1, len(FIELDS)),
+                         meta=np.array([run, data_size], dtype=np.int64))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.index_path)
+        finally:
+            lock_file.close()
+        print(f"Price history: run {run}, {changed} of {len(observed)} products changed, {len(buf)} bytes", flush=True)
+        return entry
+
+    def record_csv(self, data_file, unavailable=()):
+        return self.record_run(pd.read_csv(data_file), unavailable)
+
+    # --- Reads ---
+    def runs(self):
+        return list(self.refresh().runs)
+
+    def history(self, key):
+        # Values after every change of one product, oldest first; None for an unknown product
+        state = self.refresh()
+        slot = self._slot(state, key)
+        if slot is None:
+            return None
+        current = state.values[slot].tolist()
+        offset = int(state.offsets[slot])
+        points = []
+        while offset >= 0:
+            run, _, prev, _, fields, _ = decode_record(state.data, offset)
+            points.append((run, list(current)))
+            for i, (delta, appeared, gone) in fields.items():
+                current[i] = MISSING if appeared else _z(current[i]) - delta
+            offset = prev
+        at = {r['run']: r['at'] for r in state.runs}
+        return [dict({'run': run, 'at': at.get(run)},
+                     **{name: _unscaled(v, scale) for v, (name, scale) in zip(vals, FIELDS)})
+                for run, vals in reversed(points)]
+
+    def price_drops(self, from_run=None, to_run=None, limit=20):
+        # Largest price decreases between two runs (default: the last two), one scan of the data up to to_run
+        state = self.refresh()
+        last = len(state.runs)
+        if from_run is None and to_run is None and last < 2:
+            return []
+        to_run = last if to_run is None else to_run
+        from_run = to_run - 1 if from_run is None else from_run
+        if not 0 <= from_run < to_run <= last:
+            raise ValueError(f'Runs must satisfy 0 <= from < to <= {last}')
+        limit = max(1, min(limit, MAX_DROPS))
+        cache_key = (from_run, to_run, limit)
+        if cache_key in self._drops:
+            return self._drops[cache_key]
+        price = np.full(len(state.offsets), MISSING, dtype=np.int64)
+        keys = [None] * len(state.offsets)
+        before = None
+        pos = 0
+        while pos < state.data_size:
+            run, slot, _, key, fields, next_pos = decode_record(state.data, pos)
+            if run > to_run:
+                break
+            if run > from_run and before is None:
+                before = price.copy()
+            if key is not None:
+                keys[slot] = key
+            if 0 in fields:
+                delta, _, gone = fields[0]
+                price[slot] = MISSING if gone else _z(price[slot]) + delta
+            pos = next_pos
+        if before is None:
+            before = price.copy()
+        both = (before != MISSING) & (price != MISSING) & (price < before)
+        slots = np.flatnonzero(both)
+        drop = before[slots] - price[slots]
+        top = slots[np.argsort(-drop, kind='stable')[:limit]]
+        result = []
+        for s in top.tolist():
+            old, new = int(before[s]), int(price[s])
+            result.append({'key': keys[s], 'from_price': old, 'to_price': new, 'drop': old - new,
+                           'drop_pct': round((old - new) / old * 100, 2) if old else None})
+        self._drops[cache_key] = result
+        return result
+
+
+history = PriceHistory()
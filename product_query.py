@@ -0,0 +1,94 @@
+import os
+import json
+import base64
+import numpy as np
+import pandas as pd
+from metrics import stage_timer
+
+DEFAULT_PER_PAGE = 20
+# Hard cap on products per response, whatever the client asks for
+MAX_PER_PAGE = int(os.environ.get('MAX_PER_PAGE', 100))
+
+
+def _price(value):
+    if value is None or value == '':
+        return None
+    return float(value)
+
+
+def query_rows(ds, brand=None, title=None, min_price=None, max_price=None, sort_by=None, ascending=True):
+    # Row ids (positions in ds.df) matching the filters, in page order
+    with stage_timer('filter'):
+        rows = ds.index.match(brand=brand, title=title)
+        min_price, max_price = _price(min_price), _price(max_price)
+        if min_price is not None or max_price is not None:
+            price_rows = ds.sorted.range('price', min_price, max_price)
+            if rows is None:
+                rows = np.sort(price_rows)
+            else:
+                rows = np.intersect1d(rows, price_rows)
+    if sort_by and sort_by in ds.df.columns:
+        with stage_timer('sort'):
+            return ds.sorted.order(sort_by, rows, ascending)
+    if rows is None:
+        return np.arange(len(ds.df))
+    return rows
+
+
+def page_size(value, default=DEFAULT_PER_PAGE):
+    try:
+        per_page = int(value) if value not in (None, '') else default
+    except (TypeError, ValueError):
+        per_page = default
+    return min(max(per_page, 1), MAX_PER_PAGE)
+
+
+def encode_cursor(sort_by, ascending, value, row):
+    payload = json.dumps([sort_by or '', bool(ascending), value, int(row)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_by, ascending, value, row = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return (sort_by or None), bool(ascending), value, int(row)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def _sort_value(ds, sort_by, row):
+    if sort_by is None:
+        return None
+    value = ds.df[sort_by].iloc[row]
+    if pd.isna(value):
+        return None
+    return float(value) if isinstance(value, (int, float, np.number)) else str(value)
+
+
+def page_rows(ds, rows, page=1, per_page=DEFAULT_PER_PAGE, cursor=None, sort_by=None, ascending=True):
+    # One page of the ordered rows plus the keyset cursor of the page after it.
+    # With a cursor the start is found by binary search on (sort value, row id), so
+    # deep pages cost the same as the first one and survive inserts/deletes before them.
+    with stage_timer('paginate'):
+        if cursor:
+            c_sort, c_asc, value, row = decode_cursor(cursor)
+            if c_sort != (sort_by if sort_by in ds.df.columns else None) or c_asc != bool(ascending):
+                raise ValueError('Cursor does not match sort_by/order')
+            if c_sort is None:
+                start = int(np.searchsorted(rows, row, side='right'))
+            else:
+                done = ds.sorted.position(c_sort, value, row, ascending)
+                if len(rows) == len(ds.df):
+                    start = done
+                else:
+                    start = int(np.searchsorted(ds.sorted.ranks(c_sort, rows, ascending), done, side='left'))
+        else:
+            start = (max(page, 1) - 1) * per_page
+        chunk = rows[start:start + per_page]
+        next_cursor = None
+        if len(chunk) and start + per_page < len(rows):
+            last = int(chunk[-1])
+            sort_col = sort_by if sort_by in ds.df.columns else None
+            next_cursor = encode_cursor(sort_col, ascending, _sort_value(ds, sort_col, last), last)
+    return chunk, next_cursor
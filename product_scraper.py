@@ -0,0 +1,26 @@
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from extractor import parse_product, PRODUCT_READY_CSS
+from run_log import stage
+
+# Result of scraping one product page:
+#   ('ok', [product_link, title, brand, price, discount, avg_rating, total_ratings, image_url])
+#   ('unavailable', link)
+#   ('failed', link, error)
+
+PRODUCT_COLUMNS = ['product_link', 'title', 'brand', 'price', 'discount', 'avg_rating', 'total_ratings', 'image_url']
+
+
+def scrape_product(driver, product_page_link):
+    try:
+        with stage('navigate', url=product_page_link, via='browser'):
+            driver.get(product_page_link)
+        # Wait only until the fields the extractor needs are in the DOM
+        with stage('wait', url=product_page_link):
+            WebDriverWait(driver, 20, poll_frequency=0.1).until(EC.presence_of_element_located((By.CSS_SELECTOR, PRODUCT_READY_CSS)))
+        # One page_source round-trip, every field is then read locally with lxml
+        with stage('extract', url=product_page_link):
+            return parse_product(driver.page_source, product_page_link)
+    except Exception as e:
+        return ('failed', product_page_link, str(e))
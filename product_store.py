@@ -0,0 +1,482 @@
+import os
+import math
+import threading
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from snapshot import write_snapshot, load_snapshot
+from search_index import SearchIndex
+from sorted_index import SortedIndex
+from facets import FacetIndex
+from key_index import KeyIndex
+from mutation_log import MutationLog, LOG_FILE, COMPACT_THRESHOLD
+from metrics import stage_timer, DATASET_VERSION, DATASET_ROWS, DATASET_LOG_SEQ
+
+DATA_FILE = 'flipkart_product_data.csv'
+SNAPSHOT_FILE = 'flipkart_product_data.snap'
+
+# Compact dtypes for the scraped catalogue
+INT_COLUMNS = ['price', 'total_ratings']
+FLOAT_COLUMNS = ['discount', 'avg_rating']
+CATEGORY_COLUMNS = ['brand']
+
+
+def _compact(df):
+    for col in INT_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').round().astype('Int64')
+    for col in FLOAT_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float32')
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+
+# One consistent version of the catalogue: frame plus the indexes built for it.
+# version counts reloads in this process, tag names the content (base file + log position)
+# the same way in every process, so it can key caches on disk. seq is the last log entry
+# read when the state was built; row positions stay valid while the log is still at seq.
+Dataset = namedtuple('Dataset', ['df', 'index', 'sorted', 'facets', 'keys', 'version', 'tag', 'seq'])
+
+
+def to_records(df):
+    # JSON friendly rows: float32 -> rounded float, NaN/NA -> None
+    df = df.copy()
+    for col in FLOAT_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('float64').round(4)
+    df = df.astype(object).where(df.notna(), None)
+    return df.to_dict(orient='records')
+
+
+def parse_number(value, col):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    try:
+        number = float(value.replace(',', '')) if isinstance(value, str) else float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'invalid {col}')
+    if not math.isfinite(number):
+        raise ValueError(f'invalid {col}')
+    return int(round(number)) if col in INT_COLUMNS else number
+
+
+def clean_row(row, columns):
+    # Request body -> row for the log: known columns only, numbers parsed, text as str.
+    # Raises ValueError (400 in the servers) instead of logging a row no replay can apply.
+    if not isinstance(row, dict):
+        raise ValueError('A product must be a JSON object')
+    unknown = [str(k) for k in row if k not in columns]
+    if unknown:
+        raise ValueError(f"Unknown column(s): {', '.join(unknown)}")
+    cleaned = {}
+    for k, v in row.items():
+        if isinstance(v, (bool, dict, list)):
+            raise ValueError(f'invalid {k}')
+        if k in INT_COLUMNS or k in FLOAT_COLUMNS:
+            cleaned[k] = parse_number(v, k)
+        else:
+            cleaned[k] = None if v is None else str(v)
+    return cleaned
+
+
+def _apply_updates(df, updates):
+    # (idx, row) pairs set in place column by column, a later pair wins over an earlier one.
+    # Everything is checked before the first column is set, a bad pair leaves df untouched.
+    columns = {}
+    for idx, row in updates:
+        if not isinstance(row, dict) or not isinstance(idx, int) or not 0 <= idx < len(df):
+            raise ValueError(f'bad update of row {idx!r}')
+        for k, v in row.items():
+            if k in df.columns:
+                columns.setdefault(k, {})[idx] = v
+    for k, values in columns.items():
+        dtype = df[k].dtype
+        new = list(values.values())
+        if not pd.api.types.is_numeric_dtype(dtype):
+            new = [None if v is None else str(v) for v in new]
+        if isinstance(dtype, pd.CategoricalDtype):
+            added = {v for v in new if v is not None} - set(dtype.categories)
+            if added:
+                # Kept sorted like astype('category') does, sort_by orders by category code
+                df[k] = df[k].cat.set_categories(sorted([*dtype.categories, *added]))
+        elif pd.api.types.is_numeric_dtype(dtype):
+            new = pd.to_numeric(pd.Series(new, dtype=object), errors='coerce')
+            if pd.api.types.is_integer_dtype(dtype):
+                new = new.round()
+            new = new.astype(dtype).array
+        df.iloc[list(values), df.columns.get_loc(k)] = new
+
+
+def apply_entries(df, entries):
+    # Replays log entries on a copy of the frame; consecutive adds are concatenated in one go.
+    # Returns the frame and the entries applied: an entry that cannot be applied (written
+    # before rows were validated, or against another base file) is reported and skipped
+    # instead of failing every load after it.
+    df = df.copy()
+    added = []
+    applied = []
+
+    def flush(df):
+        if not added:
+            return df
+        # Keys that are not columns of the catalogue are left out, not added as columns
+        new_rows = pd.DataFrame(added).reindex(columns=df.columns)
+        added.clear()
+        return _compact(pd.concat([df, new_rows], ignore_index=True))
+
+    for entry in entries:
+        op = entry['op']
+        try:
+            if op == 'add':
+                if not all(isinstance(row, dict) for row in entry['rows']):
+                    raise ValueError('rows must be objects')
+                added.extend(entry['rows'])
+                applied.append(entry)
+                continue
+            df = flush(df)
+            if op == 'update':
+                _apply_updates(df, [(entry['idx'], entry['row'])])
+            elif op == 'update_many':
+                _apply_updates(df, entry['updates'])
+            elif op == 'delete':
+                idx = entry['idx']
+                if not isinstance(idx, int) or not 0 <= idx < len(df):
+                    raise ValueError(f'no row {idx!r}')
+                df = df.drop(df.index[idx]).reset_index(drop=True)
+        except Exception as e:
+            print(f"Skipping log entry #{entry.get('seq')} ({op}): {e}", flush=True)
+            continue
+        applied.append(entry)
+    return flush(df), applied
+
+
+def save_snapshot(df, path=SNAPSHOT_FILE):
+    write_snapshot(_compact(df.copy()), path)
+
+
+def _row_delta(entry):
+    if entry['op'] == 'add':
+        return len(entry['rows'])
+    if entry['op'] == 'delete':
+        return -1
+    if entry['op'] == 'count':
+        return entry['rows']
+    return 0
+
+
+def row_changes(rows, entries):
+    # Where the rows after entries come from: origin[i] is the position row i had before
+    # (-1: added), fresh marks rows added or updated by the entries
+    origin = np.arange(rows, dtype=np.int64)
+    fresh = np.zeros(rows, dtype=bool)
+    for entry in entries:
+        op = entry['op']
+        if op == 'add':
+            origin = np.concatenate([origin, np.full(len(entry['rows']), -1, dtype=np.int64)])
+            fresh = np.concatenate([fresh, np.ones(len(entry['rows']), dtype=bool)])
+        elif op == 'update':
+            fresh[entry['idx']] = True
+        elif op == 'update_many':
+            fresh[[idx for idx, _ in entry['updates']]] = True
+        elif op == 'delete':
+            origin = np.delete(origin, entry['idx'])
+            fresh = np.delete(fresh, entry['idx'])
+    return origin, fresh
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class ProductStore:
+    def __init__(self, path=DATA_FILE, snapshot_path=SNAPSHOT_FILE, log_path=LOG_FILE):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.log = MutationLog(log_path)
+        self.version = 0
+        self.snapshot = None
+        self.source = None
+        self.index = None
+        self.facets = None
+        # Row count including log entries not yet applied to the frame
+        self.rows = 0
+        self.applied_seq = 0
+        self._df = None
+        self._state = None
+        self._stat = None
+        self._base_stat = None
+        self._base_seq = 0
+        # Whether the log has a checkpoint for the current base file / for another one
+        self._base_checked = False
+        self._foreign_base = False
+        self._pending = []
+        self._compacting = False
+        self._lock = threading.RLock()
+        # Off in pre-forked workers (serve.py): the parent loads new versions and compacts,
+        # workers keep the version they were forked with
+        self.auto_refresh = True
+
+    def _file_stat(self):
+        return (_stat(self.path), _stat(self.snapshot_path), _stat(self.log.path))
+
+    def _load(self):
+        csv_stat, snap_stat, _ = self._file_stat()
+        # Prefer the memory-mapped snapshot unless the CSV was written after it
+        if snap_stat and (csv_stat is None or snap_stat[0] >= csv_stat[0]):
+            try:
+                self.snapshot = load_snapshot(self.snapshot_path)
+                self.source = self.snapshot_path
+                return self.snapshot.to_frame()
+            except (ValueError, OSError) as e:
+                print(f"Ignoring unreadable snapshot {self.snapshot_path}: {e}", flush=True)
+        df = _compact(pd.read_csv(self.path))
+        self.source = self.path
+        try:
+            # Leave a snapshot behind so the next process can map it instead of parsing
+            write_snapshot(df, self.snapshot_path)
+            self.snapshot = load_snapshot(self.snapshot_path)
+        except OSError as e:
+            print(f"Could not write snapshot {self.snapshot_path}: {e}", flush=True)
+            self.snapshot = None
+        return df
+
+    def _sync(self):
+        # Caller holds self._lock. Picks up base file changes and new log entries
+        # without applying the entries to the frame yet.
+        base_stat = self._file_stat()[:2]
+        if self._df is None or base_stat != self._base_stat:
+            self._df = self._load()
+            self._base_stat = self._file_stat()[:2]
+            self._base_seq = self.applied_seq = 0
+            self._base_checked = self._foreign_base = False
+            self._pending = []
+            self.rows = len(self._df)
+            self.log.reset()
+        for entry in self.log.read_new():
+            if entry['op'] == 'checkpoint':
+                if entry['base'] != list(self._base_stat[0] or ()):
+                    self._foreign_base = True
+                    continue
+                self._base_checked = True
+                if entry['upto'] > self._base_seq:
+                    # The base file already contains everything up to this checkpoint
+                    self._base_seq = entry['upto']
+                    self._pending = [e for e in self._pending if e['seq'] > self._base_seq]
+                    self.applied_seq = max(self.applied_seq, self._base_seq)
+                    self.rows = len(self._df) + sum(_row_delta(e) for e in self._pending)
+                continue
+            if entry['seq'] <= self.applied_seq or entry['seq'] <= self._base_seq:
+                continue
+            if not self.auto_refresh and self._state is not None:
+                # Never applied in this process (serve.py workers keep the version they were
+                # forked with), only the row count it changes is kept, not its rows
+                entry = {'seq': entry['seq'], 'op': 'count', 'rows': _row_delta(entry)}
+            self._pending.append(entry)
+            self.rows += _row_delta(entry)
+        if self._foreign_base and not self._base_checked and self._base_seq < self.log.seq:
+            # The log was written against another base file and nothing says this one contains
+            # it (e.g. the CSV rewritten by a scrape): its positions mean nothing here, so none
+            # of it is replayed
+            print(f"Ignoring mutation log up to #{self.log.seq}: written for another {self.path}", flush=True)
+            self._pending = []
+            self._base_seq = self.applied_seq = self.log.seq
+            self.rows = len(self._df)
+
+    def refresh(self):
+        # Reload only when the base file's mtime or size changed or the log grew
+        if not self.auto_refresh and self._state is not None:
+            return False
+        stat = self._file_stat()
+        if stat == self._stat and self._state is not None:
+            return False
+        with self._lock, stage_timer('load'):
+            stat = self._file_stat()
+            if stat == self._stat and self._state is not None:
+                return False
+            self._sync()
+            df, entries = self._df, self._pending
+            # Positions in the entries refer to this frame; when it is the one the current
+            # indexes were built for, they are patched from the entries
+            patch = self._state is not None and df is self._state.df
+            if entries:
+                df, entries = apply_entries(df, entries)
+                self._df = df
+                self.applied_seq = self._pending[-1]['seq']
+                self._pending = []
+                # Skipped entries no longer count towards the rows new positions are given from
+                self.rows = len(df)
+            if self._state is not None and df is self._state.df:
+                # Only checkpoints were read, rows are unchanged
+                self._state = self._state._replace(seq=self.log.seq)
+                self._stat = stat
+                return False
+            if self._state is None:
+                index, facets, sorted_index = SearchIndex.build(df), FacetIndex.build(df), SortedIndex.build(df)
+                keys = KeyIndex.build(df)
+            elif patch:
+                # Only rows the entries added or updated are re-tokenized / bucketed / merged,
+                # the others are moved to their new positions
+                origin, fresh = row_changes(len(self._state.df), entries)
+                index = self.index.updated(df, origin, fresh)
+                facets = self.facets.updated(df, origin, fresh)
+                sorted_index = self._state.sorted.updated(df, origin, fresh)
+                keys = self._state.keys.updated(df, origin, fresh)
+            else:
+                # Base file reloaded (e.g. compacted elsewhere): rows are compared by position
+                index = self.index.updated(df)
+                facets = self.facets.updated(df)
+                sorted_index = SortedIndex.build(df)
+                keys = KeyIndex.build(df)
+            # Swapped as one tuple so readers never pair a frame with another version's index
+            self.version += 1
+            base = self._base_stat[0] or (0, 0)
+            tag = f'{base[0]:x}-{base[1]:x}-{self.applied_seq}'
+            self._state = Dataset(df, index, sorted_index, facets, keys, self.version, tag, self.log.seq)
+            self.index = index
+            self.facets = facets
+            self._stat = self._file_stat()
+            DATASET_VERSION.set(self.version)
+            DATASET_ROWS.set(len(df))
+            DATASET_LOG_SEQ.set(self.applied_seq)
+            print(f"Loaded {len(df)} rows from {self.source} + log up to #{self.applied_seq} (version {self.version})", flush=True)
+            return True
+
+    # --- Writes: one fsynced log line under the single-writer lock ---
+    def _write(self, entries, idxs=()):
+        with self.log.writer():
+            with self._lock:
+                self._sync()
+                if any(not 0 <= idx < self.rows for idx in idxs):
+                    return False
+                if not self._base_checked:
+                    # First write against this base file: the checkpoint ties the positions
+                    # that follow to it, a base file replaced later without one drops them
+                    base = list(self._base_stat[0] or ())
+                    entries = [{'op': 'checkpoint', 'upto': self._base_seq, 'base': base}] + list(entries)
+                self.log.append_many(entries)
+                self._sync()
+        if self.auto_refresh and self.needs_compaction():
+            self.compact_in_background()
+        return True
+
+    def needs_compaction(self):
+        with self._lock:
+            return self.log.seq - self._base_seq >= COMPACT_THRESHOLD
+
+    def add(self, rows):
+        columns = self.columns()
+        return self._write([{'op': 'add', 'rows': [clean_row(row, columns) for row in rows]}])
+
+    def update(self, idx, row):
+        return self._write([{'op': 'update', 'idx': idx, 'row': clean_row(row, self.columns())}], [idx])
+
+    def delete(self, idx):
+        return self._write([{'op': 'delete', 'idx': idx}], [idx])
+
+    def upsert(self, rows, updates, expected_seq=None):
+        # New rows plus (idx, row) updates as one batch: one lock, one fsync, one log entry
+        # for all the updates. Returns (position of the first new row, log seq after the write),
+        # or None when an index is out of range or the log moved past expected_seq since
+        # positions were read. Columns come from the current version without refreshing it,
+        # an ingest folds its batches in once at the end.
+        columns = set(self._state.df.columns) if self._state is not None else self.columns()
+        entries = []
+        if updates:
+            entries.append({'op': 'update_many', 'updates': [[idx, clean_row(row, columns)] for idx, row in updates]})
+        if rows:
+            entries.append({'op': 'add', 'rows': [clean_row(row, columns) for row in rows]})
+        with self.log.writer():
+            with self._lock:
+                self._sync()
+                if expected_seq is not None and self.log.seq != expected_seq:
+                    return None
+                start = self.rows
+                if entries and not self._write(entries, [idx for idx, _ in updates]):
+                    return None
+                return start, self.log.seq
+
+    def compact(self):
+        # Folds the log into the base CSV. Writers are only blocked while the
+        # materialized frame is taken and while the files are swapped.
+        with self.log.writer():
+            self.refresh()
+            with self._lock:
+                df, upto = self._state.df, self.applied_seq
+            if upto <= self._base_seq:
+                return False
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        df.to_csv(tmp_path, index=False)
+        with open(tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
+        st = os.stat(tmp_path)
+        with self.log.writer():
+            with self._lock:
+                self._sync()
+                self.log.append({'op': 'checkpoint', 'upto': upto, 'base': [st.st_mtime_ns, st.st_size]})
+                os.replace(tmp_path, self.path)
+                self.log.truncate(upto)
+        print(f"Compacted mutation log up to #{upto} into {self.path}", flush=True)
+        self.refresh()
+        return True
+
+    def compact_in_background(self):
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+
+        def run():
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"Compaction failed: {e}", flush=True)
+            finally:
+                self._compacting = False
+
+        threading.Thread(target=run, name='product-log-compaction', daemon=True).start()
+
+    def get(self):
+        # Shallow copy: handlers can filter/assign columns without touching the shared frame
+        # (copy on write, see enable_copy_on_write)
+        self.refresh()
+        return self._state.df.copy(deep=False)
+
+    def current(self):
+        # Frame and indexes of the same version, row ids from the indexes are positions in the frame
+        self.refresh()
+        ds = self._state
+        return ds._replace(df=ds.df.copy(deep=False))
+
+    def columns(self):
+        self.refresh()
+        return list(self._state.df.columns)
+
+    def __len__(self):
+        self.refresh()
+        return len(self._state.df)
+
+
+def enable_copy_on_write():
+    # get()/current() hand out shallow copies of the shared frame. pandas >= 3 always copies
+    # on write; on older versions the servers turn the option on for their process at startup
+    # instead of every importer of the store getting it.
+    if int(pd.__version__.split('.')[0]) < 3:
+        pd.set_option('mode.copy_on_write', True)
+
+
+store = ProductStore()
+
+
+def get_products_df():
+    return store.get()
+
+
+def current():
+    return store.current()
@@ -0,0 +1,123 @@
+import os
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from flask import current_app, request, Response
+from metrics import stage_timer, cache_lookup
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only without it
+    brotli = None
+
+# LRU cache of serialized /api/products responses keyed by dataset version + normalized query.
+# Each entry keeps its body, a strong ETag and the compressed variants built so far.
+
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 1024))
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_SIZE = 500
+
+
+class CacheEntry:
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.encoded = {}
+
+    def encode(self, encoding):
+        if encoding not in self.encoded:
+            if encoding == 'br':
+                self.encoded[encoding] = brotli.compress(self.body, quality=5)
+            else:
+                self.encoded[encoding] = gzip.compress(self.body, compresslevel=6)
+        return self.encoded[encoding]
+
+
+class QueryCache:
+    def __init__(self, name='products', maxsize=RESULT_CACHE_SIZE):
+        self.name = name
+        self.maxsize = maxsize
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, version, key):
+        with self._lock:
+            if self.version is None or version > self.version:
+                # New dataset version: everything cached so far is stale
+                self._entries.clear()
+                self.version = version
+            # A request still pinned to an older version misses, and put() drops its entry
+            entry = self._entries.get(key) if version == self.version else None
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        cache_lookup(self.name, entry is not None)
+        return entry
+
+    def put(self, version, key, entry):
+        with self._lock:
+            if version != self.version:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+product_cache = QueryCache()
+facet_cache = QueryCache('facets')
+
+
+def normalize_query(args, effective=None):
+    # Same query in any parameter order / case / spacing -> same key. effective holds the
+    # values the request actually runs with (page, clamped per_page...), they win over args.
+    effective = effective or {}
+    key = []
+    for name in ('brand', 'title', 'min_price', 'max_price', 'sort_by', 'order', 'page', 'per_page', 'cursor'):
+        value = effective[name] if name in effective else args.get(name, '')
+        value = '' if value is None else str(value).strip()
+        if name in ('brand', 'title'):
+            value = ' '.join(value.lower().split())
+        elif name in ('min_price', 'max_price') and value:
+            try:
+                value = float(value)
+            except ValueError:
+                pass
+        key.append(value)
+    return tuple(key)
+
+
+def _negotiate(accept_encoding):
+    accepted = {part.split(';')[0].strip() for part in accept_encoding.lower().split(',')}
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def cached_json(version, key, build, cache=product_cache):
+    # build() returns the payload dict; it only runs on a cache miss
+    entry = cache.get(version, key)
+    if entry is None:
+        payload = build()
+        with stage_timer('serialize'):
+            entry = CacheEntry(current_app.json.dumps(payload).encode('utf-8'))
+        cache.put(version, key, entry)
+
+    headers = {'ETag': f'"{entry.etag}"', 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+    if request.if_none_match.contains(entry.etag):
+        return Response(status=304, headers=headers)
+    body = entry.body
+    encoding = _negotiate(request.headers.get('Accept-Encoding', '')) if len(body) >= MIN_COMPRESS_SIZE else None
+    if encoding:
+        with stage_timer('compress'):
+            body = entry.encode(encoding)
+        headers['Content-Encoding'] = encoding
+    return Response(body, mimetype='application/json', headers=headers)
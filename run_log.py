@@ -0,0 +1,74 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# Structured timings of a scrape run, one JSON object per line, e.g.
+#   {"run": "20261018T181500-4242", "ts": 1792346867.66, "stage": "navigate", "seconds": 0.412, "url": "..."}
+# Stages: navigate (page request / driver.get), wait (selector waits), extract (parsing),
+# write (flushing rows to disk). The last line of a run is its summary with per-stage totals.
+# Nothing is recorded unless a run was started, so library code can time stages freely.
+
+RUN_LOG_FILE = os.environ.get('SCRAPE_RUN_LOG', 'scrape_runs.jsonl')
+
+
+class RunLog:
+    def __init__(self, path=RUN_LOG_FILE, run_id=None):
+        self.path = path
+        self.run_id = run_id or f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        self.started = time.time()
+        self.totals = {}
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def event(self, **fields):
+        line = json.dumps(dict({'run': self.run_id, 'ts': round(time.time(), 3)}, **fields), default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+
+    def record(self, stage, seconds, **fields):
+        with self._lock:
+            count, total = self.totals.get(stage, (0, 0.0))
+            self.totals[stage] = (count + 1, total + seconds)
+        self.event(stage=stage, seconds=round(seconds, 4), **fields)
+
+    @contextmanager
+    def stage(self, name, **fields):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, **fields)
+
+    def close(self, **summary):
+        stages = {name: {'count': count, 'seconds': round(total, 3)} for name, (count, total) in self.totals.items()}
+        self.event(stage='summary', seconds=round(time.time() - self.started, 3), stages=stages, **summary)
+        with self._lock:
+            self._file.close()
+
+
+_active = None
+
+
+def start(path=RUN_LOG_FILE):
+    global _active
+    _active = RunLog(path)
+    return _active
+
+
+def finish(**summary):
+    global _active
+    if _active is not None:
+        _active.close(**summary)
+        _active = None
+
+
+@contextmanager
+def stage(name, **fields):
+    run = _active
+    if run is None:
+        yield
+        return
+    with run.stage(name, **fields):
+        yield
@@ -0,0 +1,472 @@
+import io
+import os
+import time
+import uuid
+import queue
+import argparse
+import threading
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlencode
+import pandas as pd
+from flask import Flask, jsonify, request
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from browser import new_driver, BROWSER_PROFILE
+from canonical import product_key, canonical_url
+from extractor import parse_product_links, SEARCH_READY_CSS
+from http_fetch import new_session, fetch_product
+from scrape_workers import _driver_alive
+from product_scraper import scrape_product, PRODUCT_COLUMNS
+from scrape_state import ScrapeState, STATE_FILE, REFRESH_AFTER_HOURS
+from product_store import store
+from bulk_ingest import ingest_csv
+from price_history import history
+from metrics import instrument
+import run_log
+from run_log import stage
+
+# Long-running scrape service: jobs (search term, page depth, freshness policy) come in
+# through submit() or POST /api/jobs and share one set of workers, one pooled HTTP session
+# and a few warm browsers that stay open between jobs. Jobs start on the search results URL
+# directly, no homepage / login popup / search box. Workers take tasks (results pages, then
+# the product pages they list) from the active jobs in turn, so a 50-page job cannot starve
+# a 2-page one, and every request, whatever its job, waits for a token of one global bucket
+# (the pooled session does not retry on its own, a retry would skip the bucket).
+# A finished job is upserted into the catalogue and recorded as a price history run.
+
+SEARCH_URL = os.environ.get('FLIPKART_SEARCH_URL', 'https://www.flipkart.com/search')
+SERVICE_PORT = int(os.environ.get('SCRAPE_SERVICE_PORT', 5060))
+SERVICE_WORKERS = int(os.environ.get('SCRAPE_SERVICE_WORKERS', 8))
+# Requests per second to the site across all jobs, and how many may go out back to back
+RATE_LIMIT = float(os.environ.get('SCRAPE_RATE_LIMIT', 4))
+RATE_BURST = int(os.environ.get('SCRAPE_RATE_BURST', 8))
+# Warm browsers for pages that do not parse over HTTP
+BROWSER_POOL_SIZE = int(os.environ.get('SCRAPE_BROWSERS', 2))
+# A browser is restarted after this many pages, long-lived Chrome keeps growing
+BROWSER_MAX_PAGES = 500
+DEFAULT_PAGES = 2
+MAX_PAGES = 50
+# Finished jobs kept for GET /api/jobs
+MAX_FINISHED_JOBS = 200
+
+
+def search_url(query, page, base_url=SEARCH_URL):
+    return f"{base_url}?{urlencode({'q': query, 'page': page})}"
+
+
+class TokenBucket:
+    # rate tokens per second, up to burst saved up; acquire() blocks for the caller's slot
+    def __init__(self, rate=RATE_LIMIT, burst=RATE_BURST):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Going below zero reserves a future slot, so waiters are served in arrival order
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class BrowserPool:
+    # Browsers started on first use and kept open between pages and jobs
+    def __init__(self, size=BROWSER_POOL_SIZE, profile=BROWSER_PROFILE, make_driver=new_driver):
+        self.profile = profile
+        self.make_driver = make_driver
+        self.started = 0
+        self._idle = []
+        self._slots = threading.BoundedSemaphore(max(1, size))
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def driver(self):
+        with self._slots:
+            with self._lock:
+                entry = self._idle.pop() if self._idle else None
+            if entry is not None and not _driver_alive(entry[0]):
+                # Died while idle, or failed a page without raising (scrape_product reports
+                # errors as results): replaced instead of handed out again
+                _quit(entry[0])
+                entry = None
+            if entry is None:
+                entry = [self.make_driver(profile=self.profile), 0]
+                with self._lock:
+                    self.started += 1
+            try:
+                yield entry[0]
+            except Exception:
+                # A crashed or wedged browser is replaced on next use
+                _quit(entry[0])
+                raise
+            entry[1] += 1
+            if entry[1] >= BROWSER_MAX_PAGES:
+                _quit(entry[0])
+            else:
+                with self._lock:
+                    self._idle.append(entry)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for driver, _ in idle:
+            _quit(driver)
+
+
+def _quit(driver):
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+class Job:
+    def __init__(self, query, pages=DEFAULT_PAGES, max_age_hours=REFRESH_AFTER_HOURS, failed_only=False, max_products=None):
+        if not query or not str(query).strip():
+            raise ValueError('query is required')
+        self.id = uuid.uuid4().hex[:12]
+        self.query = str(query).strip()
+        self.pages = min(max(int(pages), 1), MAX_PAGES)
+        self.max_age_hours = float(max_age_hours)
+        self.failed_only = bool(failed_only)
+        self.max_products = int(max_products) if max_products else None
+        self.status = 'queued'
+        self.error = None
+        self.submitted = time.time()
+        self.started = self.finished = None
+        self.stats = {'pages': 0, 'failed_pages': 0, 'links': 0, 'fresh': 0, 'scraped': 0, 'failed': 0, 'unavailable': 0}
+        # Filled by ScrapeService.add with the results page URLs
+        self.tasks = deque()
+        self.in_flight = 0
+        self.seen = set()
+        self.rows = []
+        self.unavailable = []
+        self.lock = threading.Lock()
+
+    def to_dict(self):
+        return {'id': self.id, 'query': self.query, 'pages': self.pages, 'max_age_hours': self.max_age_hours,
+                'failed_only': self.failed_only, 'max_products': self.max_products, 'status': self.status,
+                'error': self.error, 'submitted': self.submitted, 'started': self.started, 'finished': self.finished,
+                'queued_tasks': len(self.tasks), 'stats': dict(self.stats)}
+
+
+class Scheduler:
+    # Round robin over jobs with work left: each next_task() serves the next job in turn
+    def __init__(self):
+        self._active = deque()
+        self._cond = threading.Condition()
+        self.stopping = False
+
+    def add(self, job):
+        with self._cond:
+            self._active.append(job)
+            self._cond.notify_all()
+
+    def push(self, job, tasks):
+        with self._cond:
+            if job.status == 'cancelled':
+                return
+            job.tasks.extend(tasks)
+            self._cond.notify_all()
+
+    def drop_pages_after(self, job, page):
+        with self._cond:
+            job.tasks = deque(t for t in job.tasks if t[0] != 'page' or t[2] < page)
+
+    def next_task(self):
+        # -> (job, task), or None once stopping
+        with self._cond:
+            while not self.stopping:
+                for _ in range(len(self._active)):
+                    job = self._active[0]
+                    self._active.rotate(-1)
+                    if job.tasks:
+                        job.in_flight += 1
+                        if job.status == 'queued':
+                            job.status, job.started = 'running', time.time()
+                        return job, job.tasks.popleft()
+                self._cond.wait()
+            return None
+
+    def task_done(self, job):
+        # True for the call that finished the job's last task
+        with self._cond:
+            job.in_flight -= 1
+            if job.tasks or job.in_flight or job not in self._active:
+                return False
+            self._active.remove(job)
+            return True
+
+    def cancel(self, job):
+        with self._cond:
+            job.tasks.clear()
+            if not job.in_flight and job in self._active:
+                self._active.remove(job)
+                return True
+            return False
+
+    def stop(self):
+        with self._cond:
+            self.stopping = True
+            self._cond.notify_all()
+
+
+class ScrapeService:
+    def __init__(self, workers=SERVICE_WORKERS, rate=RATE_LIMIT, burst=RATE_BURST, browsers=BROWSER_POOL_SIZE,
+                 browser_profile=BROWSER_PROFILE, state_path=STATE_FILE, search_base=SEARCH_URL):
+        self.workers = max(1, workers)
+        self.search_base = search_base
+        self.bucket = TokenBucket(rate, burst)
+        self.browsers = BrowserPool(browsers, browser_profile)
+        self.session = new_session(self.workers, retry=False)
+        self.state = ScrapeState(state_path)
+        self.scheduler = Scheduler()
+        self.jobs = {}
+        self._jobs_lock = threading.Lock()
+        # Finished jobs are saved one at a time, off the worker threads
+        self._finished = queue.Queue()
+        self._threads = []
+
+    def start(self):
+        self._threads = [threading.Thread(target=self._worker, name=f'scrape-worker-{i}', daemon=True) for i in range(self.workers)]
+        self._threads.append(threading.Thread(target=self._saver, name='scrape-saver', daemon=True))
+        for t in self._threads:
+            t.start()
+        return self
+
+    def stop(self):
+        self.scheduler.stop()
+        self._finished.put(None)
+        for t in self._threads:
+            t.join()
+        self.browsers.close()
+        self.state.close()
+
+    def submit(self, query, **options):
+        return self.add(Job(query, **options))
+
+    def add(self, job):
+        job.tasks.extend(('page', search_url(job.query, page, self.search_base), page) for page in range(1, job.pages + 1))
+        with self._jobs_lock:
+            self.jobs[job.id] = job
+            done = [j for j in self.jobs.values() if j.finished]
+            for old in sorted(done, key=lambda j: j.finished)[:max(0, len(done) - MAX_FINISHED_JOBS)]:
+                del self.jobs[old.id]
+        self.scheduler.add(job)
+        print(f"Job {job.id}: '{job.query}', {job.pages} pages", flush=True)
+        return job
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+        job.status = 'cancelled'
+        if self.scheduler.cancel(job):
+            self._finished.put(job)
+        return job
+
+    # --- Workers ---
+    def _worker(self):
+        while True:
+            item = self.scheduler.next_task()
+            if item is None:
+                return
+            job, task = item
+            try:
+                if task[0] == 'page':
+                    self._results_page(job, task[1], task[2])
+                else:
+                    self._product_page(job, task[1])
+            except Exception as e:
+                print(f"Job {job.id}: {task[1]} failed: {e}", flush=True)
+            if self.scheduler.task_done(job):
+                self._finished.put(job)
+
+    def _results_page(self, job, url, page):
+        found, last_page = [], False
+        self.bucket.acquire()
+        try:
+            with stage('navigate', url=url, via='http', page='results'):
+                response = self.session.get(url, timeout=15)
+            if response.status_code == 200:
+                with stage('extract', url=url, page='results'):
+                    found = parse_product_links(response.content, url)
+                # Loaded and listed nothing: past the last results page, unless the browser finds some
+                last_page = not found
+        except Exception as e:
+            print(f"HTTP fetch of {url} failed: {e}", flush=True)
+        if not found:
+            self.bucket.acquire()
+            try:
+                with self.browsers.driver() as driver:
+                    with stage('navigate', url=url, via='browser', page='results'):
+                        driver.get(url)
+                    try:
+                        with stage('wait', url=url, page='results'):
+                            WebDriverWait(driver, 10, poll_frequency=0.1).until(EC.presence_of_element_located((By.CSS_SELECTOR, SEARCH_READY_CSS)))
+                    except Exception:
+                        pass
+                    with stage('extract', url=url, page='results'):
+                        found = parse_product_links(driver.page_source, url)
+            except Exception as e:
+                print(f"Browser fetch of {url} failed: {e}", flush=True)
+
+        if last_page and not found:
+            # Past the last results page: later pages of this job would be empty too
+            self.scheduler.drop_pages_after(job, page)
+        todo = []
+        with job.lock:
+            if found or last_page:
+                job.stats['pages'] += 1
+            else:
+                # Neither fetch got the page: a transient failure, later pages are still tried
+                job.stats['failed_pages'] += 1
+            for link in found:
+                key = product_key(link)
+                if key in job.seen or (job.max_products and len(job.seen) >= job.max_products):
+                    continue
+                job.seen.add(key)
+                job.stats['links'] += 1
+                link = canonical_url(link)
+                if self.state.needs_scrape(link, job.max_age_hours, job.failed_only):
+                    todo.append(('product', link))
+                else:
+                    job.stats['fresh'] += 1
+                    entry = self.state.lookup(link)
+                    if entry and entry['row']:
+                        job.rows.append(entry['row'])
+        print(f"Job {job.id}: {url} ------> {len(found)} products, {len(todo)} to scrape", flush=True)
+        if todo:
+            self.scheduler.push(job, todo)
+
+    def _product_page(self, job, link):
+        self.bucket.acquire()
+        result = fetch_product(self.session, link)
+        if result[0] == 'failed':
+            self.bucket.acquire()
+            try:
+                with self.browsers.driver() as driver:
+                    result = scrape_product(driver, link)
+            except Exception as e:
+                result = ('failed', link, str(e))
+        self.state.record(link, result)
+        with job.lock:
+            job.stats['scraped'] += 1
+            if result[0] == 'ok':
+                job.rows.append(result[1])
+            elif result[0] == 'unavailable':
+                job.stats['unavailable'] += 1
+                job.unavailable.append(link)
+            else:
+                job.stats['failed'] += 1
+
+    # --- Results ---
+    def _saver(self):
+        while True:
+            job = self._finished.get()
+            if job is None:
+                return
+            try:
+                self._save(job)
+                if job.status != 'cancelled':
+                    job.status = 'done'
+            except Exception as e:
+                job.status, job.error = 'failed', str(e)
+                print(f"Job {job.id}: saving results failed: {e}", flush=True)
+            job.finished = time.time()
+            print(f"Job {job.id} {job.status}: {job.stats}", flush=True)
+
+    def _save(self, job):
+        df = pd.DataFrame(job.rows, columns=PRODUCT_COLUMNS)
+        if df.empty and not job.unavailable:
+            return
+        if not df.empty:
+            if os.path.exists(store.path):
+                # Same path as a bulk upload: known products are updated, new ones added
+                job.stats['ingest'] = ingest_csv(store, io.StringIO(df.to_csv(index=False)))
+            else:
+                tmp_path = f'{store.path}.{os.getpid()}.tmp'
+                df.drop_duplicates('product_link').to_csv(tmp_path, index=False)
+                os.replace(tmp_path, store.path)
+        history.record_run(df, job.unavailable)
+
+
+# --- HTTP API ---
+def create_app(service):
+    app = Flask(__name__)
+    # Route latency histograms and GET /metrics
+    instrument(app)
+
+    @app.route('/api/jobs', methods=['POST'])
+    def submit_jobs():
+        # {"query": "..."} or {"queries": [...]}, plus pages, max_age_hours, failed_only, max_products
+        try:
+            body = request.get_json(silent=True) or {}
+            queries = body.get('queries') or [body.get('query')]
+            if isinstance(queries, str):
+                queries = [queries]
+            options = {k: body[k] for k in ('pages', 'max_age_hours', 'failed_only', 'max_products') if body.get(k) is not None}
+            # Every job is validated before any is queued
+            jobs = [Job(q, **options) for q in queries]
+            for job in jobs:
+                service.add(job)
+            return jsonify({'jobs': [job.to_dict() for job in jobs]}), 202
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/jobs', methods=['GET'])
+    def list_jobs():
+        return jsonify({'jobs': [job.to_dict() for job in list(service.jobs.values())],
+                        'browsers_started': service.browsers.started})
+
+    @app.route('/api/jobs/<job_id>', methods=['GET'])
+    def get_job(job_id):
+        job = service.jobs.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job.to_dict())
+
+    @app.route('/api/jobs/<job_id>', methods=['DELETE'])
+    def cancel_job(job_id):
+        job = service.cancel(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job.to_dict())
+
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Scrape service: queued search jobs sharing warm browsers and one rate limit')
+    parser.add_argument('queries', nargs='*', help='search terms to queue at startup')
+    parser.add_argument('--pages', type=int, default=DEFAULT_PAGES)
+    parser.add_argument('--port', type=int, default=SERVICE_PORT)
+    parser.add_argument('--workers', type=int, default=SERVICE_WORKERS)
+    parser.add_argument('--rate', type=float, default=RATE_LIMIT, help='requests per second across all jobs, 0 for no limit')
+    parser.add_argument('--burst', type=int, default=RATE_BURST)
+    parser.add_argument('--browsers', type=int, default=BROWSER_POOL_SIZE)
+    parser.add_argument('--search-url', default=SEARCH_URL, help='search results URL, e.g. a fixture_site.py /search')
+    args = parser.parse_args()
+    # Stage timings of every job go to the JSON lines run log, like 01_scrapy.py
+    run_log.start()
+    service = ScrapeService(args.workers, args.rate, args.burst, args.browsers, search_base=args.search_url).start()
+    for q in args.queries:
+        service.submit(q, pages=args.pages)
+    try:
+        create_app(service).run(port=args.port, threaded=True, debug=False, use_reloader=False)
+    finally:
+        service.stop()
+        run_log.finish(jobs=len(service.jobs))
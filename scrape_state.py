@@ -0,0 +1,116 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from urllib.parse import urlsplit, parse_qs
+
+# Persistent per-product scrape state, keyed by the pid query parameter.
+# Every result is committed as it arrives, so an interrupted run resumes from
+# where it stopped: products already scraped count as fresh on the next run.
+
+STATE_FILE = 'scrape_state.db'
+REFRESH_AFTER_HOURS = 24
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS products (
+    pid TEXT PRIMARY KEY,
+    link TEXT NOT NULL,
+    status TEXT NOT NULL,          -- ok / unavailable / failed
+    scraped_at REAL NOT NULL,
+    content_hash TEXT,
+    row TEXT,                      -- JSON list in PRODUCT_COLUMNS order, for status ok
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0
+)
+'''
+
+
+def product_id(link):
+    query = parse_qs(urlsplit(link).query)
+    if query.get('pid'):
+        return query['pid'][0]
+    return urlsplit(link).path
+
+
+def content_hash(row):
+    # The link carries per-session tracking parameters, only the scraped values count
+    return hashlib.sha1(json.dumps(row[1:], default=str).encode('utf-8')).hexdigest()
+
+
+class ScrapeState:
+    def __init__(self, path=STATE_FILE):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self.changed = 0
+
+    def close(self):
+        self._conn.close()
+
+    def _get(self, pids):
+        found = {}
+        pids = list(pids)
+        for i in range(0, len(pids), 500):
+            chunk = pids[i:i + 500]
+            marks = ','.join('?' * len(chunk))
+            with self._lock:
+                rows = self._conn.execute(f'SELECT pid, link, status, scraped_at, row FROM products WHERE pid IN ({marks})', chunk).fetchall()
+            for pid, link, status, scraped_at, row in rows:
+                found[pid] = {'link': link, 'status': status, 'scraped_at': scraped_at, 'row': json.loads(row) if row else None}
+        return found
+
+    def lookup(self, link):
+        return self._get([product_id(link)]).get(product_id(link))
+
+    @staticmethod
+    def _due(entry, cutoff, failed_only):
+        if entry is None:
+            return not failed_only
+        if entry['status'] == 'failed':
+            return True
+        return not failed_only and entry['scraped_at'] < cutoff
+
+    def needs_scrape(self, link, max_age_hours=REFRESH_AFTER_HOURS, failed_only=False):
+        return self._due(self.lookup(link), time.time() - max_age_hours * 3600, failed_only)
+
+    def seed(self, rows, scraped_at):
+        # Products of an existing dataset the state has never seen count as scraped at scraped_at
+        values = []
+        for row in rows:
+            row = list(row)
+            values.append((product_id(row[0]), row[0], scraped_at, content_hash(row), json.dumps(row, default=str)))
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO products (pid, link, status, scraped_at, content_hash, row) VALUES (?, ?, 'ok', ?, ?, ?)",
+                values)
+            self._conn.commit()
+            added = self._conn.total_changes - before
+        if added:
+            print(f"Scrape state: seeded {added} products from the existing dataset", flush=True)
+
+    def record(self, link, result):
+        pid = product_id(link)
+        status = result[0]
+        row = result[1] if status == 'ok' else None
+        digest = content_hash(row) if row else None
+        error = result[2] if status == 'failed' else None
+        with self._lock:
+            old = self._conn.execute('SELECT content_hash FROM products WHERE pid = ?', (pid,)).fetchone()
+            if digest and old and old[0] and old[0] != digest:
+                self.changed += 1
+            self._conn.execute(
+                '''INSERT INTO products (pid, link, status, scraped_at, content_hash, row, error, attempts)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+                   ON CONFLICT(pid) DO UPDATE SET
+                       link = excluded.link, status = excluded.status, scraped_at = excluded.scraped_at,
+                       content_hash = COALESCE(excluded.content_hash, products.content_hash),
+                       row = COALESCE(excluded.row, CASE WHEN excluded.status = 'failed' THEN products.row END),
+                       error = excluded.error, attempts = products.attempts + 1''',
+                (pid, link, status, time.time(), digest, json.dumps(row, default=str) if row else None, error))
+            self._conn.commit()
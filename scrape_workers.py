@@ -0,0 +1,93 @@
+import os
+import queue
+import threading
+from browser import new_driver
+from product_scraper import scrape_product
+
+# Number of browsers scraping product pages in parallel
+DETAIL_WORKERS = int(os.environ.get('SCRAPE_WORKERS', 4))
+# A link is retried on a fresh browser this many times when its browser crashed
+MAX_ATTEMPTS = 3
+
+
+def _driver_alive(driver):
+    try:
+        driver.title
+        return True
+    except Exception:
+        return False
+
+
+def _quit(driver):
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+def summarize(results):
+    # (product rows, unavailable links, failed count), failures count as unavailable like before
+    complete_product_details = [r[1] for r in results if r and r[0] == 'ok']
+    unavailable_products = [r[1] for r in results if r and r[0] != 'ok']
+    failed_count = sum(1 for r in results if r and r[0] == 'failed')
+    return complete_product_details, unavailable_products, failed_count
+
+
+def scrape_results(links, workers=DETAIL_WORKERS, headless=True, scrape=scrape_product, make_driver=new_driver, on_result=None):
+    # Scrapes links with a pool of browsers pulling from one queue.
+    # Returns one result tuple per link, in input order; on_result(link, result) is
+    # called as each one lands (e.g. to checkpoint it).
+    tasks = queue.Queue()
+    for i, link in enumerate(links):
+        tasks.put((i, link, 1))
+    results = [None] * len(links)
+    progress = {'done': 0, 'failed': 0}
+    progress_lock = threading.Lock()
+
+    def report(i, result):
+        with progress_lock:
+            if result[0] == 'failed':
+                progress['failed'] += 1
+                print(f"Failed to establish a connection for URL {result[1]}:  {result[2]}")
+                print(f"Failed URL Count {progress['failed']}")
+            else:
+                progress['done'] += 1
+                print(f"URL {progress['done']} completed {'*******' if result[0] == 'ok' else '--->'}")
+            if on_result is not None:
+                on_result(links[i], result)
+
+    def worker(wid):
+        driver = None
+        try:
+            while True:
+                try:
+                    i, link, attempt = tasks.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    if driver is None:
+                        driver = make_driver(headless=headless)
+                    result = scrape(driver, link)
+                except Exception as e:
+                    result = ('failed', link, str(e))
+                if result[0] == 'failed' and (driver is None or not _driver_alive(driver)):
+                    # Browser crashed (or never started): replace it and put the link back
+                    print(f"Worker {wid}: browser lost on {link}, restarting")
+                    if driver is not None:
+                        _quit(driver)
+                    driver = None
+                    if attempt < MAX_ATTEMPTS:
+                        tasks.put((i, link, attempt + 1))
+                        continue
+                results[i] = result
+                report(i, result)
+        finally:
+            if driver is not None:
+                _quit(driver)
+
+    threads = [threading.Thread(target=worker, args=(wid,), name=f'scrape-worker-{wid}') for wid in range(max(1, workers))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
@@ -0,0 +1,171 @@
+import re
+import numpy as np
+from collections import defaultdict
+
+# Inverted index from normalized tokens (and their prefixes) to sorted row ids.
+# A query term matches every token it is a prefix of, so 'bru' finds 'BRUTON'.
+
+SEARCH_FIELDS = ['brand', 'title']
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+MIN_PREFIX_LEN = 2
+# Above this share of changed rows a full rebuild is cheaper than patching postings
+REBUILD_RATIO = 0.3
+
+EMPTY = np.zeros(0, dtype=np.int32)
+
+
+def normalize(text):
+    if text is None or text != text:  # None / NaN
+        return ''
+    return str(text).strip().lower()
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize(text))
+
+
+def index_terms(text):
+    terms = set()
+    for token in tokenize(text):
+        terms.add(token)
+        for end in range(MIN_PREFIX_LEN, len(token)):
+            terms.add(token[:end])
+    return terms
+
+
+def _build_postings(texts):
+    postings = defaultdict(list)
+    for row, text in enumerate(texts):
+        for term in index_terms(text):
+            postings[term].append(row)
+    return {term: np.array(rows, dtype=np.int32) for term, rows in postings.items()}
+
+
+def _without(rows, ids):
+    # Sorted posting list minus ids; a copy without re-sorting the list
+    at = np.searchsorted(rows, ids)
+    present = at < len(rows)
+    present[present] = rows[at[present]] == ids[present]
+    return np.delete(rows, at[present])
+
+
+def _with(rows, ids):
+    # Sorted posting list plus sorted ids
+    at = np.searchsorted(rows, ids)
+    present = at < len(rows)
+    present[present] = rows[at[present]] == ids[present]
+    return np.insert(rows, at[~present], ids[~present])
+
+
+class SearchIndex:
+    def __init__(self, texts, postings):
+        # texts: field -> list of normalized strings, postings: field -> {term: row ids}
+        self.texts = texts
+        self.postings = postings
+        self.rows = len(next(iter(texts.values()))) if texts else 0
+
+    @classmethod
+    def build(cls, df, fields=SEARCH_FIELDS):
+        texts, postings = {}, {}
+        for field in fields:
+            if field not in df.columns:
+                continue
+            texts[field] = [normalize(v) for v in df[field].tolist()]
+            postings[field] = _build_postings(texts[field])
+        return cls(texts, postings)
+
+    def updated(self, df, origin=None, fresh=None):
+        # Returns a new index for df, re-tokenizing only rows whose text changed.
+        # origin[i] is the position row i of df had in the indexed frame (-1: added) and fresh
+        # marks the rows added or updated since (product_store.row_changes); without them rows
+        # are compared by position. The current index is left untouched for requests still using it.
+        n = len(df)
+        if origin is None:
+            origin = np.full(n, -1, dtype=np.int64)
+            origin[:min(n, self.rows)] = np.arange(min(n, self.rows))
+            fresh = np.ones(n, dtype=bool)
+        fresh_rows = np.flatnonzero(fresh)
+        origins = origin.tolist()
+        # Old rows kept their positions: only postings of changed rows need patching
+        in_place = n >= self.rows and np.array_equal(origin[:self.rows], np.arange(self.rows))
+        texts, postings = {}, {}
+        for field, old_texts in self.texts.items():
+            if field not in df.columns:
+                return SearchIndex.build(df)
+            changed = []
+            for i, text in zip(fresh_rows.tolist(), df[field].iloc[fresh_rows].tolist()):
+                text = normalize(text)
+                if origins[i] < 0 or old_texts[origins[i]] != text:
+                    changed.append((i, text))
+            if in_place:
+                new_texts = old_texts + [''] * (n - self.rows)
+            else:
+                new_texts = [old_texts[o] if o >= 0 else '' for o in origins]
+            for i, text in changed:
+                new_texts[i] = text
+            # remap: old row id -> new row id, -1 for rows deleted or changed
+            keep = origin >= 0
+            keep[[i for i, _ in changed]] = False
+            remap = np.full(self.rows, -1, dtype=np.int32)
+            remap[origin[keep]] = np.flatnonzero(keep)
+            dropped = np.flatnonzero(remap < 0)
+            texts[field] = new_texts
+            if len(changed) + len(dropped) > REBUILD_RATIO * max(n, 1):
+                postings[field] = _build_postings(new_texts)
+                continue
+
+            field_postings = dict(self.postings[field])
+            if in_place:
+                drop = defaultdict(list)
+                for i in dropped.tolist():
+                    for term in index_terms(old_texts[i]):
+                        drop[term].append(i)
+                for term, rows in drop.items():
+                    field_postings[term] = _without(field_postings[term], np.array(rows, dtype=np.int32))
+            else:
+                # Rows moved (deletes): map every posting list to the new row ids. Kept rows
+                # never change order, so the lists stay sorted.
+                for term, rows in self.postings[field].items():
+                    rows = remap[rows]
+                    field_postings[term] = rows[rows >= 0]
+            add = defaultdict(list)
+            for i, text in changed:
+                for term in index_terms(text):
+                    add[term].append(i)
+            for term, rows in add.items():
+                field_postings[term] = _with(field_postings.get(term, EMPTY), np.array(rows, dtype=np.int32))
+            postings[field] = {term: rows for term, rows in field_postings.items() if len(rows)}
+        return SearchIndex(texts, postings)
+
+    def _term_rows(self, field, term):
+        postings = self.postings[field]
+        if len(term) >= MIN_PREFIX_LEN:
+            return postings.get(term, EMPTY)
+        # Single characters are not indexed as prefixes, union the two-char prefixes instead
+        parts = [rows for t, rows in postings.items() if t[0] == term and len(t) <= MIN_PREFIX_LEN]
+        return np.unique(np.concatenate(parts)) if parts else EMPTY
+
+    def search(self, field, query):
+        terms = tokenize(query)
+        if not terms:
+            # Nothing tokenizable (e.g. punctuation), fall back to a substring scan
+            needle = normalize(query)
+            return np.array([i for i, t in enumerate(self.texts[field]) if needle in t], dtype=np.int32)
+        # Intersect shortest posting lists first
+        lists = sorted((self._term_rows(field, t) for t in set(terms)), key=len)
+        rows = lists[0]
+        for other in lists[1:]:
+            if not len(rows):
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+    def match(self, **queries):
+        # match(brand='nike', title='running') -> sorted row ids, or None when no query given
+        rows = None
+        for field, query in queries.items():
+            if not query or field not in self.postings:
+                continue
+            found = self.search(field, query)
+            rows = found if rows is None else np.intersect1d(rows, found, assume_unique=True)
+        return rows
@@ -0,0 +1,178 @@
+import os
+import gc
+import sys
+import time
+import select
+import signal
+import socket
+import argparse
+import importlib
+from werkzeug.serving import make_server, WSGIRequestHandler
+from product_store import store
+
+# Pre-fork serving: one port, a pool of worker processes, e.g.
+#   python serve.py web_api_server --workers 8 --port 5050
+# The parent loads the catalogue and its indexes once and forks the workers, which share
+# those pages copy-on-write instead of each building its own copy. The parent watches the
+# data files; on a new version it loads it, stops the current workers from accepting and
+# forks a new generation, so no connection is answered from an older version once a newer
+# one has started serving. POST/PUT/DELETE from workers show up after the next swap.
+
+SERVERS = {'api': 'api_server', 'web': 'web_api_server', 'advanced': 'advanced_api_server'}
+WORKERS = int(os.environ.get('SERVE_WORKERS', os.cpu_count() or 1))
+# How often the parent checks the data files for a new version
+RELOAD_SECONDS = float(os.environ.get('SERVE_RELOAD_SECONDS', 1.0))
+# Idle keep-alive connections are closed after this, so retired workers can exit
+KEEPALIVE_SECONDS = 5
+# Longest wait for a retired generation to stop accepting before the next one starts anyway
+RETIRE_TIMEOUT = 10
+POLL_SECONDS = 0.1
+
+_stopping = False
+
+
+def _stop(signum, frame):
+    global _stopping
+    _stopping = True
+
+
+class _Handler(WSGIRequestHandler):
+    timeout = KEEPALIVE_SECONDS
+
+    def handle_one_request(self):
+        super().handle_one_request()
+        # A retired worker finishes the request in hand, the client reconnects to the new generation
+        if _stopping:
+            self.close_connection = True
+
+
+def _worker(app, sock, host, port, gen_fd):
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    store.auto_refresh = False
+    server = make_server(host, port, app, threaded=True, request_handler=_Handler, fd=sock.fileno())
+    # Wait for in-flight requests before exiting
+    server.daemon_threads = False
+    server.timeout = POLL_SECONDS
+    sock.close()
+    while not _stopping:
+        server.handle_request()
+    server.socket.close()
+    # Closing our end of the generation pipe tells the parent we stopped accepting
+    os.close(gen_fd)
+    server.server_close()
+    os._exit(0)
+
+
+class Generation:
+    # Workers forked from one loaded version. Every worker holds the write end of a pipe,
+    # the parent sees EOF on the read end once all of them have stopped accepting.
+    def __init__(self, version):
+        self.version = version
+        self.read_fd, self.write_fd = os.pipe()
+        self.pids = set()
+
+    def spawn(self, app, sock, host, port):
+        pid = os.fork()
+        if pid == 0:
+            os.close(self.read_fd)
+            try:
+                _worker(app, sock, host, port, self.write_fd)
+            finally:
+                os._exit(1)
+        self.pids.add(pid)
+        return pid
+
+    def retire(self):
+        for pid in self.pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        os.close(self.write_fd)
+        deadline = time.monotonic() + RETIRE_TIMEOUT
+        while time.monotonic() < deadline:
+            ready, _, _ = select.select([self.read_fd], [], [], max(0, deadline - time.monotonic()))
+            if ready and not os.read(self.read_fd, 1):
+                break
+        os.close(self.read_fd)
+
+
+def _load():
+    store.refresh()
+    # Objects from the load are never freed or moved by the collector, so workers
+    # do not dirty (and copy) the shared pages just by collecting
+    gc.collect()
+    gc.freeze()
+
+
+def serve(module, host='127.0.0.1', port=5050, workers=WORKERS):
+    app = importlib.import_module(module).app
+    _load()
+    sock = socket.create_server((host, port), backlog=1024)
+    # Non-blocking, so a worker that loses the race for a connection goes back to select
+    sock.setblocking(False)
+    host, port = sock.getsockname()[:2]
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    generation = Generation(store.version)
+    for _ in range(workers):
+        generation.spawn(app, sock, host, port)
+    retired = set()
+    print(f"Serving {module} on http://{host}:{port} with {workers} workers (version {store.version})", flush=True)
+
+    while not _stopping:
+        time.sleep(RELOAD_SECONDS)
+        # Reap exited workers; replace those that died while still current
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            retired.discard(pid)
+            if pid in generation.pids:
+                generation.pids.discard(pid)
+                print(f"Worker {pid} exited with status {status}, restarting", flush=True)
+                generation.spawn(app, sock, host, port)
+        try:
+            if store.needs_compaction():
+                # No threads may be running in the parent when it forks, so compact inline
+                store.compact()
+            store.refresh()
+        except Exception as e:
+            print(f"Reload failed, still serving version {generation.version}: {e}", flush=True)
+            continue
+        if store.version == generation.version:
+            continue
+        gc.unfreeze()
+        gc.collect()
+        gc.freeze()
+        generation.retire()
+        retired |= generation.pids
+        generation = Generation(store.version)
+        for _ in range(workers):
+            generation.spawn(app, sock, host, port)
+        print(f"Swapped {workers} workers to version {store.version}", flush=True)
+
+    generation.retire()
+    for pid in generation.pids | retired:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    sock.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve one of the product APIs with a pre-forked worker pool')
+    parser.add_argument('server', nargs='?', default='web', help=f"one of {', '.join(SERVERS)} or a module name")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5050)
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    args = parser.parse_args()
+    if not hasattr(os, 'fork'):
+        sys.exit('serve.py needs os.fork; use app.run() on this platform')
+    serve(SERVERS.get(args.server, args.server), args.host, args.port, max(1, args.workers))
@@ -0,0 +1,188 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+# Columnar binary snapshot of the product catalogue.
+#
+# File layout:
+#   MAGIC | uint64 header length | JSON header | padding | sections...
+# Every section is 64-byte aligned so it can be viewed straight out of the mmap.
+#   int      -> int64 values (INT_NULL for missing)
+#   float    -> float32/float64 values (NaN for missing)
+#   category -> int32 codes (-1 for missing) + string section with the categories
+#   str      -> int64 offsets (n+1) + utf-8 bytes (+ uint8 null mask when needed)
+
+MAGIC = b'FKSNAP1\n'
+ALIGN = 64
+INT_NULL = np.iinfo(np.int64).min
+# Strings decoded per step when a whole column is read
+SPLIT_CHUNK = 16384
+
+
+def _pad(n):
+    return (-n) % ALIGN
+
+
+def _encode_strings(values):
+    nulls = np.array([v is None or (isinstance(v, float) and np.isnan(v)) for v in values], dtype=np.uint8)
+    encoded = [b'' if null else str(v).encode('utf-8') for v, null in zip(values, nulls)]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    sections = {'offsets': offsets, 'data': data}
+    if nulls.any():
+        sections['nulls'] = nulls
+    return sections
+
+
+def _column_sections(series):
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy(dtype=np.int32)
+        cats = _encode_strings(list(series.cat.categories))
+        sections = {'codes': codes}
+        sections.update({'cat_' + k: v for k, v in cats.items()})
+        return 'category', sections
+    if pd.api.types.is_integer_dtype(dtype):
+        values = series.to_numpy(dtype=np.int64, na_value=INT_NULL)
+        return 'int', {'values': values}
+    if pd.api.types.is_float_dtype(dtype):
+        return 'float', {'values': series.to_numpy()}
+    return 'str', _encode_strings(series.astype(object).tolist())
+
+
+def write_snapshot(df, path):
+    # Written to a temp file and renamed so readers never see a half written snapshot
+    columns = {}
+    arrays = []
+    offset = 0
+    for col in df.columns:
+        kind, sections = _column_sections(df[col])
+        spec = {'kind': kind, 'sections': {}}
+        for name, arr in sections.items():
+            arr = np.ascontiguousarray(arr)
+            spec['sections'][name] = [offset, arr.dtype.str, len(arr)]
+            arrays.append(arr)
+            offset += arr.nbytes + _pad(arr.nbytes)
+        columns[col] = spec
+    header = json.dumps({'rows': len(df), 'columns': columns}).encode('utf-8')
+    base = len(MAGIC) + 8 + len(header)
+    base += _pad(base)
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header)
+        f.write(b'\0' * (base - f.tell()))
+        for arr in arrays:
+            f.write(arr.tobytes())
+            f.write(b'\0' * _pad(arr.nbytes))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _split_chunk(data, offsets):
+    start = offsets[0]
+    data = data[start:offsets[-1]]
+    if not (data == 0).any():
+        return np.insert(data, offsets[1:-1] - start, 0).tobytes().decode('utf-8').split('\0')
+    # Values containing NUL: slice the text at character offsets instead, the byte offsets
+    # less the utf-8 continuation bytes before them
+    text = data.tobytes().decode('utf-8')
+    continuation = np.concatenate([[0], np.cumsum((data & 0xC0) == 0x80)])
+    chars = (offsets - start - continuation[offsets - start]).tolist()
+    return [text[a:b] for a, b in zip(chars[:-1], chars[1:])]
+
+
+def _split(data, offsets):
+    # Strings of a section with one decode per chunk: a NUL goes between the values and the
+    # text is split on it, instead of slicing and decoding each value on its own. Chunks keep
+    # the temporary buffers small, whole-column ones stay behind in the heap after the load.
+    out = []
+    for i in range(0, len(offsets) - 1, SPLIT_CHUNK):
+        out += _split_chunk(data, offsets[i:i + SPLIT_CHUNK + 1])
+    return out
+
+
+class Snapshot:
+    def __init__(self, path):
+        self.path = path
+        # Read only shared mapping: every process mapping this file shares the same pages
+        self._buf = np.memmap(path, dtype=np.uint8, mode='r')
+        if bytes(self._buf[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f'{path} is not a product snapshot')
+        header_len = int(self._buf[len(MAGIC):len(MAGIC) + 8].view(np.uint64)[0])
+        start = len(MAGIC) + 8
+        header = json.loads(bytes(self._buf[start:start + header_len]).decode('utf-8'))
+        base = start + header_len
+        self._base = base + _pad(base)
+        self.rows = header['rows']
+        self.columns = list(header['columns'])
+        self._specs = header['columns']
+
+    def __len__(self):
+        return self.rows
+
+    def _section(self, col, name):
+        offset, dtype, count = self._specs[col]['sections'][name]
+        dtype = np.dtype(dtype)
+        start = self._base + offset
+        return self._buf[start:start + count * dtype.itemsize].view(dtype)
+
+    def kind(self, col):
+        return self._specs[col]['kind']
+
+    def column(self, col):
+        # Zero copy view for numeric columns (codes for categories)
+        kind = self.kind(col)
+        if kind == 'category':
+            return self._section(col, 'codes')
+        if kind in ('int', 'float'):
+            return self._section(col, 'values')
+        raise TypeError(f'{col} is a string column, use strings()')
+
+    def _decode(self, col, prefix=''):
+        # The whole section, decoded in bulk
+        out = _split(self._section(col, prefix + 'data'), self._section(col, prefix + 'offsets'))
+        if prefix + 'nulls' in self._specs[col]['sections']:
+            for i in np.flatnonzero(self._section(col, prefix + 'nulls')).tolist():
+                out[i] = None
+        return out
+
+    def strings(self, col):
+        if self.kind(col) == 'category':
+            cats = np.array(self.categories(col), dtype=object)
+            codes = self._section(col, 'codes')
+            out = cats[codes] if len(cats) else np.full(len(codes), None, dtype=object)
+            out[codes < 0] = None
+            return out.tolist()
+        return self._decode(col)
+
+    def categories(self, col):
+        return self._decode(col, prefix='cat_')
+
+    def _series(self, col):
+        kind = self.kind(col)
+        if kind == 'int':
+            values = self._section(col, 'values')
+            return pd.arrays.IntegerArray(values, values == INT_NULL)
+        if kind == 'float':
+            return self._section(col, 'values')
+        if kind == 'category':
+            return pd.Categorical.from_codes(self._section(col, 'codes'), categories=self.categories(col))
+        return np.array(self.strings(col), dtype=object)
+
+    def to_frame(self):
+        # Numeric columns and category codes stay backed by the mapping; text is decoded once
+        # per process. It is not left lazy in the mapping: the search index keeps the normalized
+        # title and brand of every row, and applying the log, compaction, exports and sorting
+        # by text need whole columns, so serve.py shares the decoded frame by forking instead.
+        return pd.DataFrame({col: self._series(col) for col in self.columns}, copy=False)
+
+
+def load_snapshot(path):
+    return Snapshot(path)
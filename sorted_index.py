@@ -0,0 +1,145 @@
+import threading
+import numpy as np
+import pandas as pd
+
+# Presorted permutations per column: range filters become binary searches and
+# sorted pagination a slice of the permutation instead of a sort per request.
+
+SORT_COLUMNS = ['price', 'discount', 'avg_rating', 'total_ratings']
+# Above this share of changed rows the orders are sorted again instead of patched
+REBUILD_RATIO = 0.05
+
+
+class _ColumnOrder:
+    def __init__(self, perm, valid, values):
+        self.perm = perm
+        self.valid = valid
+        self.values = values
+        self.rank = np.empty(len(perm), dtype=np.int64)
+        self.rank[perm] = np.arange(len(perm))
+
+    @classmethod
+    def of(cls, series):
+        # Missing values go last, like sort_values(na_position='last')
+        perm = series.reset_index(drop=True).sort_values(kind='stable', na_position='last').index.to_numpy(np.int64)
+        valid = int(series.notna().sum())
+        values = None
+        if pd.api.types.is_numeric_dtype(series.dtype):
+            values = series.to_numpy(dtype=np.float64, na_value=np.nan)[perm[:valid]]
+        return cls(perm, valid, values)
+
+    def patched(self, remap, rows, values):
+        # Order after a batch of mutations: remap maps old row ids to new ones (-1: deleted or
+        # changed), rows (new ids) with their values are merged in at their (value, row id) place
+        perm = remap[self.perm]
+        kept = perm[:self.valid] >= 0
+        ordered, ordered_values = perm[:self.valid][kept], self.values[kept]
+        missing = perm[self.valid:]
+        missing = missing[missing >= 0]
+        has_value = ~np.isnan(values)
+        new_rows, new_values = rows[has_value], values[has_value]
+        by_value = np.lexsort((new_rows, new_values))
+        new_rows, new_values = new_rows[by_value], new_values[by_value]
+        lo = np.searchsorted(ordered_values, new_values, side='left')
+        hi = np.searchsorted(ordered_values, new_values, side='right')
+        # Ties are ordered by row id
+        at = [l + int(np.searchsorted(ordered[l:h], row)) for l, h, row in zip(lo.tolist(), hi.tolist(), new_rows.tolist())]
+        ordered = np.insert(ordered, at, new_rows)
+        ordered_values = np.insert(ordered_values, at, new_values)
+        no_value = np.sort(rows[~has_value])
+        missing = np.insert(missing, np.searchsorted(missing, no_value), no_value)
+        return _ColumnOrder(np.concatenate([ordered, missing]), len(ordered), ordered_values)
+
+    def descending(self):
+        return np.concatenate([self.perm[:self.valid][::-1], self.perm[self.valid:]])
+
+
+class SortedIndex:
+    def __init__(self, df, columns=SORT_COLUMNS, orders=None):
+        self._df = df
+        if orders is None:
+            orders = {col: _ColumnOrder.of(df[col]) for col in columns if col in df.columns}
+        self._orders = orders
+        self._lock = threading.Lock()
+        self.rows = len(df)
+
+    @classmethod
+    def build(cls, df):
+        return cls(df)
+
+    def updated(self, df, origin, fresh):
+        # New index for df from this one, origin/fresh as in SearchIndex.updated: kept rows keep
+        # their order, fresh ones are merged in. Orders sorted on first use are left to be sorted
+        # again; the current index is left untouched for requests still using it.
+        rows = np.flatnonzero(fresh)
+        keep = ~fresh
+        if len(rows) + self.rows - int(np.count_nonzero(keep)) > REBUILD_RATIO * max(len(df), 1):
+            return SortedIndex(df)
+        remap = np.full(self.rows, -1, dtype=np.int64)
+        remap[origin[keep]] = np.flatnonzero(keep)
+        orders = {}
+        for col, order in self._orders.items():
+            if order.values is not None and col in df.columns:
+                values = df[col].iloc[rows].to_numpy(dtype=np.float64, na_value=np.nan)
+                orders[col] = order.patched(remap, rows, values)
+        return SortedIndex(df, orders=orders)
+
+    def _order(self, col):
+        # Numeric columns are presorted, anything else (title, brand...) is sorted once on first use
+        order = self._orders.get(col)
+        if order is None:
+            with self._lock:
+                order = self._orders.get(col)
+                if order is None:
+                    order = self._orders[col] = _ColumnOrder.of(self._df[col])
+        return order
+
+    def range(self, col, lo=None, hi=None):
+        # Row ids with lo <= col <= hi, in ascending value order
+        order = self._order(col)
+        start = 0 if lo is None else np.searchsorted(order.values, lo, side='left')
+        end = order.valid if hi is None else np.searchsorted(order.values, hi, side='right')
+        return order.perm[start:max(start, end)]
+
+    def position(self, col, value, row, ascending=True):
+        # How many rows come at or before (value, row) in order(col, ascending=...).
+        # Ties are ordered by row id, missing values last, so this is a pair of binary searches.
+        order = self._order(col)
+        if order.values is None:
+            # Non-numeric column: fall back to where the row itself currently sits
+            if 0 <= row < self.rows:
+                rank = order.rank[row]
+                return int(rank if ascending or rank >= order.valid else order.valid - 1 - rank) + 1
+            return 0
+        if value is None or value != value:
+            # The stable sort keeps row ids ascending inside the missing tail and inside ties
+            return order.valid + int(np.searchsorted(order.perm[order.valid:], row, side='right'))
+        lo = np.searchsorted(order.values, value, side='left')
+        hi = np.searchsorted(order.values, value, side='right')
+        ties = order.perm[lo:hi]
+        if ascending:
+            return int(lo + np.searchsorted(ties, row, side='right'))
+        return int(order.valid - hi + len(ties) - np.searchsorted(ties, row, side='left'))
+
+    def ranks(self, col, rows, ascending=True):
+        # Position of each row in order(col, ascending=...)
+        order = self._order(col)
+        rank = order.rank[np.asarray(rows, dtype=np.int64)]
+        if not ascending:
+            rank = np.where(rank < order.valid, order.valid - 1 - rank, rank)
+        return rank
+
+    def order(self, col, rows=None, ascending=True):
+        # rows sorted by col; without rows the whole permutation is returned
+        order = self._order(col)
+        if rows is None:
+            return order.perm if ascending else order.descending()
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) * 8 < self.rows:
+            # Few rows: sort them by their precomputed rank
+            return rows[np.argsort(self.ranks(col, rows, ascending), kind='stable')]
+        # Many rows: walk the permutation once with a membership mask
+        mask = np.zeros(self.rows, dtype=bool)
+        mask[rows] = True
+        perm = order.perm if ascending else order.descending()
+        return perm[mask[perm]]
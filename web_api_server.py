@@ -1,15 +1,26 @@
-from flask import Flask, jsonify, request, send_file, redirect, url_for
+from flask import Flask, jsonify, request, redirect, url_for
 import io
-import pandas as pd
+from product_store import store, get_products_df, current, to_records, enable_copy_on_write
+from product_query import query_rows, page_rows, page_size
+from response_cache import cached_json, normalize_query, facet_cache
+from metrics import instrument
+from export_stream import export_response
+from facets import facet_counts
+from price_history import history
+from canonical import product_key
 
 app = Flask(__name__)
+# Route latency histograms and GET /metrics
+instrument(app)
+enable_copy_on_write()
 
 
 # --- API: GET with search, filter, sort, pagination ---
 @app.route('/api/products', methods=['GET'])
 def get_products():
     try:
-        df = pd.read_csv('flipkart_product_data.csv')
+        ds = current()
+        df = ds.df
         # Filtering
         brand = request.args.get('brand')
         title = request.args.get('title')
@@ -18,24 +29,24 @@ def get_products():
         sort_by = request.args.get('sort_by')
         order = request.args.get('order', 'asc')
         page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
-
-        if brand:
-            df = df[df['brand'].str.contains(brand, case=False, na=False)]
-        if title:
-            df = df[df['title'].str.contains(title, case=False, na=False)]
-        if min_price is not None:
-            df = df[df['price'].astype(float) >= min_price]
-        if max_price is not None:
-            df = df[df['price'].astype(float) <= max_price]
-        if sort_by and sort_by in df.columns:
-            df = df.sort_values(by=sort_by, ascending=(order=='asc'))
-
-        total = len(df)
-        start = (page-1)*per_page
-        end = start+per_page
-        data = df.iloc[start:end].to_dict(orient='records')
-        return jsonify({'products': data, 'total': total, 'page': page, 'per_page': per_page})
+        per_page = page_size(request.args.get('per_page'))
+        cursor = request.args.get('cursor')
+
+
+        def build():
+            # Index lookups and binary searches, page order is a slice of the presorted permutation
+            rows = query_rows(ds, brand=brand, title=title, min_price=min_price, max_price=max_price,
+                              sort_by=sort_by, ascending=(order=='asc'))
+            total = len(rows)
+            # page/per_page for offset paging, or the opaque next_cursor of the previous response
+            chunk, next_cursor = page_rows(ds, rows, page, per_page, cursor, sort_by, order=='asc')
+            data = to_records(df.iloc[chunk])
+            return {'products': data, 'total': total, 'page': page, 'per_page': per_page, 'next_cursor': next_cursor}
+
+        key = normalize_query(request.args, {'order': order, 'page': page, 'per_page': per_page})
+        return cached_json(ds.version, key, build)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -44,10 +55,10 @@ def get_products():
 def add_product():
     try:
         new_product = request.json
-        df = pd.read_csv('flipkart_product_data.csv')
-        df = df.append(new_product, ignore_index=True)
-        df.to_csv('flipkart_product_data.csv', index=False)
+        store.add([new_product])
         return jsonify({'message': 'Product added successfully.'}), 201
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -56,14 +67,11 @@ def add_product():
 def update_product(idx):
     try:
         update_data = request.json
-        df = pd.read_csv('flipkart_product_data.csv')
-        if idx < 0 or idx >= len(df):
+        if not store.update(idx, update_data):
             return jsonify({'error': 'Invalid index'}), 404
-        for k, v in update_data.items():
-            if k in df.columns:
-                df.at[idx, k] = v
-        df.to_csv('flipkart_product_data.csv', index=False)
         return jsonify({'message': 'Product updated successfully.'})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -71,20 +79,83 @@ def update_product(idx):
 @app.route('/api/products/<int:idx>', methods=['DELETE'])
 def delete_product(idx):
     try:
-        df = pd.read_csv('flipkart_product_data.csv')
-        if idx < 0 or idx >= len(df):
+        if not store.delete(idx):
             return jsonify({'error': 'Invalid index'}), 404
-        df = df.drop(df.index[idx])
-        df.to_csv('flipkart_product_data.csv', index=False)
         return jsonify({'message': 'Product deleted successfully.'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# --- API: Price history of one product across scrape runs, by index or ?link= ---
+@app.route('/api/products/<int:idx>/history', methods=['GET'])
+@app.route('/api/products/history', methods=['GET'])
+def product_history(idx=None):
+    try:
+        if idx is None:
+            link = request.args.get('link')
+            if not link:
+                return jsonify({'error': 'link is required'}), 400
+        else:
+            df = current().df
+            if idx < 0 or idx >= len(df):
+                return jsonify({'error': 'Invalid index'}), 404
+            link = df['product_link'].iloc[idx]
+        key = product_key(link)
+        points = history.history(key)
+        if points is None:
+            return jsonify({'error': 'No history for this product'}), 404
+        return jsonify({'key': key, 'history': points})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# --- API: Biggest price drops between two scrape runs (default: the last two) ---
+@app.route('/api/products/price_drops', methods=['GET'])
+def price_drops():
+    try:
+        drops = history.price_drops(request.args.get('from', type=int), request.args.get('to', type=int),
+                                    request.args.get('limit', 20, type=int))
+        return jsonify({'runs': history.runs(), 'drops': drops})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# --- Helper: rows matching the /api/products filters ---
+def filtered_rows(ds):
+    return query_rows(ds, brand=request.args.get('brand'), title=request.args.get('title'),
+                      min_price=request.args.get('min_price', type=float),
+                      max_price=request.args.get('max_price', type=float),
+                      sort_by=request.args.get('sort_by'), ascending=(request.args.get('order', 'asc')=='asc'))
+
+# --- API: Streaming export (NDJSON or CSV) with the same filters as GET ---
+@app.route('/api/products/export', methods=['GET'])
+def export_products():
+    try:
+        ds = current()
+        return export_response(ds, filtered_rows(ds), request.args.get('format', 'ndjson'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# --- API: Facet counts (brands, price/discount histograms, rating buckets) for the current filter ---
+@app.route('/api/products/facets', methods=['GET'])
+def get_facets():
+    try:
+        ds = current()
+        filters = {name: request.args.get(name) for name in ('brand', 'title', 'min_price', 'max_price')}
+        return cached_json(ds.version, normalize_query(filters), lambda: facet_counts(ds, **filters), cache=facet_cache)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # --- API: Download CSV ---
 @app.route('/api/products/download', methods=['GET'])
 def download_csv():
     try:
-        return send_file('flipkart_product_data.csv', as_attachment=True)
+        # Streamed from the current dataset, so pending (uncompacted) changes are included
+        ds = current()
+        return export_response(ds, filtered_rows(ds), 'csv')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -93,7 +164,8 @@ def download_csv():
 @app.route('/')
 def show_products():
     try:
-        df = pd.read_csv('flipkart_product_data.csv')
+        ds = current()
+        df = ds.df
         # Get query params
         brand = request.args.get('brand', '')
         title = request.args.get('title', '')
@@ -101,25 +173,17 @@ def show_products():
         max_price = request.args.get('max_price', '')
         sort_by = request.args.get('sort_by', 'price')
         order = request.args.get('order', 'asc')
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 20))
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = page_size(request.args.get('per_page'))
 
-        # Filtering
-        if brand:
-            df = df[df['brand'].str.contains(brand, case=False, na=False)]
-        if title:
-            df = df[df['title'].str.contains(title, case=False, na=False)]
-        if min_price:
-            df = df[df['price'].astype(float) >= float(min_price)]
-        if max_price:
-            df = df[df['price'].astype(float) <= float(max_price)]
-        if sort_by in df.columns:
-            df = df.sort_values(by=sort_by, ascending=(order=='asc'))
-
-        total = len(df)
+        # Filtering and sorting through the dataset indexes
+        rows = query_rows(ds, brand=brand, title=title, min_price=min_price, max_price=max_price,
+                          sort_by=sort_by, ascending=(order=='asc'))
+
+        total = len(rows)
         start = (page-1)*per_page
         end = start+per_page
-        page_df = df.iloc[start:end]
+        page_df = df.iloc[rows[start:end]]
 
         # Pagination controls
         total_pages = max(1, (total + per_page - 1) // per_page)
@@ -180,9 +244,9 @@ def show_products():
 @app.route('/product/<int:idx>')
 def product_detail(idx):
     try:
-        df = pd.read_csv('flipkart_product_data.csv')
+        df = get_products_df()
         if idx < 0 or idx >= len(df):
-            return f"<h3>Product not found</h3>"
+            return "<h3>Product not found</h3>"
         row = df.iloc[idx]
         html = f'''
         <html>